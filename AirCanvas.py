@@ -1,421 +1,795 @@
+import argparse
+import concurrent.futures
+import math
+import os
+import signal
 import cv2
 import numpy as np
-import os
 import time
 from Hand_Detect import HandDetectorMP
-from picamera2 import Picamera2 
-from picamera2.devices import Hailo # Using hailo device for hardware-accelerated inference
+from Hand_Tracker import HandTracker
+from Detection_Scheduler import DetectionScheduler, MODES
+from Landmark_Filter import LandmarkFilter
+from Canvas_Layer import CanvasLayer
+from Stroke_Store import StrokeStore
+from Pipeline import FramePipeline
+from Frame_Source import add_source_arguments, source_from_args, wait_for_frame
+from Landmark_Trace import add_trace_arguments
+from UI_Layer import OverlayCache, UILayer
+from Session_Store import SessionWriter, save_session, load_session, latest_session, prune_sessions, session_path, export_png, export_svg
+from Metrics import Metrics, MetricsLog, FrameProfiler, hud_lines, hud_panel, draw_hud
+from Gestures import GestureSet, HitMap, DwellTracker
+from Output_Sink import OutputSinks, WindowSink, VideoRecorder, MJPEGServer
 import AirConfig
 
 
-# Global drawing parameters
-draw_color = AirConfig.default_color # default red
-brush_thickness = AirConfig.default_brush_thickness
-xp, yp = 0, 0   # previous x, previous y for drawing lines
-pressed_keys = [] # buffer for numeric color entry (RGB)
-
-# Track eraser mode
-eraser_mode = False
-
-# Hand presence tracking
-last_hand_detection_time = time.time()
-hand_timeout = AirConfig.hand_timeout  # seconds before clearing canvas when no hand detected
-
-# Flag to show helper visualization - set to False to disable
-show_helper = False  
-
-# List to store drawn stroke
-strokes = []
-
-# Predefined color options for cycling 
+# Predefined color options for cycling
 color_options = [
     AirConfig.RED_COLOR,     # Red
-    AirConfig.BLUE_COLOR,    # Blue 
+    AirConfig.BLUE_COLOR,    # Blue
     AirConfig.GREEN_COLOR,   # Green
     AirConfig.ERASER_COLOR   # Pink eraser
 ]
 
-# Load overlays
-overlays = {}
-
-for key, filename in AirConfig.overlay_paths.items():
-	img_path = os.path.join(AirConfig.folder_path, filename)
-	if os.path.exists(img_path):
-		img_overlay = cv2.imread(img_path)
-		
-		if img_overlay is not None:
-			if AirConfig.debug_mode:
-				print(f"Original size: {img_overlay.shape}")
-				
-			 # If image is taller than header height crop	
-			if img_overlay.shape[0] > AirConfig.HEADER_HEIGHT:
-				img_overlay = img_overlay[:AirConfig.HEADER_HEIGHT, :, :]
-				if AirConfig.debug_mode:
-					print(f"Cropped to header height: {img_overlay.shape}")
-					
-			# Resize to full width 
-			img_overlay = cv2.resize(img_overlay, (AirConfig.CANVAS_WIDTH, AirConfig.HEADER_HEIGHT))
-			
-			# Store in dictionary
-			overlays[key] = img_overlay
-					
-			if AirConfig.debug_mode:
-				print(f"Added '{key}' overlay with shape: {img_overlay.shape}")  
-				
-		else:
-			print(f"ERROR: Could not load image {img_path}")
-					
-	else:
-		print(f"ERROR: File not found: {img_path}")
-        
-# Set default header
-current_overlay_key = "red"
-header = overlays.get("red")
-if header is None and overlays:
-    # Fall back to first available overlay if default not found
-    current_overlay_key = next(iter(overlays.keys()))
-    header = overlays[current_overlay_key]
-    print(f"Default overlay not found, using '{current_overlay_key}' instead")
-
-if not overlays:
-    print("WARNING: No overlay images loaded!")
-    # Create basic header if no images are available
-    basic_header = np.zeros((AirConfig.HEADER_HEIGHT, AirConfig.CANVAS_WIDTH, 3), dtype=np.uint8)
-    basic_header[:, :] = (50, 50, 50)  # Dark gray background
-    overlays["red"] = basic_header
-    header = basic_header
-    current_overlay_key = "red"
-
-# Debug info
-print(f"Loaded {len(overlays)} overlay images")
-if AirConfig.debug_mode:
-	for key, overlay in overlays.items():
-		print(f"Overlay '{key}' shape: {overlay.shape}")
-	
-# Initialize hand detector with robust confidence threshold
-detector = HandDetectorMP(detection_con = AirConfig.detection_confidence, track_con = AirConfig.tracking_confidence)
-
-picam2 = Picamera2()
-main_size = (AirConfig.CANVAS_WIDTH, AirConfig.CANVAS_HEIGHT) # capture at default canvas width and height from config file
-video_config = picam2.create_preview_configuration(main={"size": main_size, "format": "RGB888"})
-picam2.configure(video_config)
-picam2.start()
-
-# Allow detector to start
-time.sleep(2)
-
-# Create named window for display
-cv2.namedWindow("Canvas", cv2.WINDOW_NORMAL)
-
-# Main loop: constant capture/process frames
-while True:
-    # Capture frame from camera
-    frame = picam2.capture_array()
-    if frame is None:
-        print("No frame captured")
-        continue
-    
-    # Flip frame for mirror effect     
-    frame = cv2.flip(frame, 1)
-    
-    # Resize to ensure frame is the predetermined canvas width and height
-    frame = cv2.resize(frame, (AirConfig.CANVAS_WIDTH, AirConfig.CANVAS_HEIGHT))
-    processed_frame = frame.copy()
-    
-    # Process hand detection on current frame
-    processed_frame = detector.find_hands(processed_frame)
-    lm_list = detector.find_position(processed_frame, draw=False)
-    
-    current_time = time.time()
-    
-    if lm_list:
-        # Hand detected, update last detection time
-        last_hand_detection_time = time.time()
-        
+
+# Drawing state of one hand: brush settings and the previous fingertip position
+class HandCursor:
+    def __init__(self, draw_color, brush_thickness, eraser_mode = False, overlay_key = "red", header = None):
+        self.draw_color = draw_color
+        self.brush_thickness = brush_thickness
+        self.eraser_mode = eraser_mode
+        self.current_overlay_key = overlay_key # header overlay showing this hand's selection
+        self.header = header
+        self.xp, self.yp = 0, 0   # previous x, previous y for drawing lines
+        self.stroke_id = None # last segment drawn, extended while the line continues
+        self.dwell = DwellTracker(AirConfig.select_dwell) # debounces color and brush button selection
+
+    # New cursor with the same brush settings, with no previous position
+    def copy(self):
+        return HandCursor(self.draw_color, self.brush_thickness, self.eraser_mode, self.current_overlay_key, self.header)
+
+    # Forget the previous position and button dwell, keeping the brush settings
+    def reset(self):
+        self.xp, self.yp = 0, 0
+        self.stroke_id = None
+        self.dwell.reset()
+
+
+# Drawing state and per-frame logic of the application. Capture and hand detection
+# happen outside this class, so the same logic serves both the synchronous loop and
+# the threaded pipeline.
+# Every hand draws with its own HandCursor. The header, brush controls and keyboard show and
+# change the settings of the active cursor: the hand that made the last selection, or the first
+# hand to appear while no hand holds it.
+class AirCanvasApp:
+    def __init__(self):
+        # Drawing parameters of the active hand (and of hands that appear later)
+        self.cursor = HandCursor(AirConfig.default_color, AirConfig.default_brush_thickness) # default red
+        self.cursors = {} # hand track id -> HandCursor
+        self.tracker = HandTracker(AirConfig.hand_track_distance, AirConfig.hand_track_timeout)
+
+        # Landmark smoothing/prediction and the measured latency from inference start to compositing
+        self.landmark_filter = LandmarkFilter(AirConfig.filter_min_cutoff, AirConfig.filter_beta) if AirConfig.landmark_filter else None
+        self.latency = 0.0
+        self.pressed_keys = [] # buffer for numeric color entry (RGB)
+
+        # Hand presence tracking
+        self.last_hand_detection_time = time.time()
+
+        # Stage timings and counters, shown on the HUD and written to the metrics log. Every value
+        # is declared up front so the metrics log keeps the same columns for the whole run.
+        self.metrics = Metrics(AirConfig.metrics_window, AirConfig.target_fps,
+                               stages=("inference", "update", "render", "compose"),
+                               counters=[f"{mode}_frames" for mode in MODES],
+                               gauges=("dropped_frames", "strokes", "latency_ms", "output_dropped"))
+        self.metrics_log = None
+        if AirConfig.metrics_log:
+            self.metrics_log = MetricsLog(AirConfig.metrics_log, AirConfig.metrics_interval,
+                                          AirConfig.metrics_log_max_bytes, AirConfig.metrics_log_backups)
+        self.show_hud = AirConfig.metrics_hud
+        self.hud_panel = None
+        self.hud_time = None
+        self.profiler = None # FrameProfiler, when profiling a number of frames
+
+        # Flag to show helper visualization - set to False to disable
+        self.show_helper = False
+
+        # Gestures recognized from the fingers up, and the label map of the color and brush buttons
+        self.gestures = GestureSet()
+        self.hit_map = HitMap(AirConfig.CANVAS_WIDTH, AirConfig.CANVAS_HEIGHT)
+        for x_min, x_max, y_min, y_max, color_name, color_value in AirConfig.color_regions:
+            self.hit_map.add(x_min, x_max, y_min, y_max, ("color", color_name, color_value))
+        for x_min, x_max, y_min, y_max, action in AirConfig.brush_control_regions:
+            self.hit_map.add(x_min, x_max, y_min, y_max, ("brush", action))
+
+        # Strokes drawn, stored with a spatial index used for eraser hit-testing and dirty region redraws
+        self.strokes = StrokeStore(AirConfig.STROKE_CAPACITY, AirConfig.SPATIAL_CELL_SIZE, AirConfig.BUCKET_SECONDS)
+        self.next_path_id = 0 # path id of the next continuous line
+
+        # Session saves and exports are written on a background thread
+        self.session_writer = SessionWriter()
+
+        # Persistent canvas, updated incrementally as strokes are added and removed (with one layer per time bucket)
+        self.canvas_layer = CanvasLayer(AirConfig.CANVAS_WIDTH, AirConfig.CANVAS_HEIGHT, AirConfig.HEADER_HEIGHT, AirConfig.BUCKET_SECONDS)
+
+        # Header overlays are loaded on first use
+        self.overlays = OverlayCache(AirConfig.folder_path, AirConfig.overlay_paths, (AirConfig.CANVAS_WIDTH, AirConfig.HEADER_HEIGHT),
+                                     AirConfig.overlay_cache_folder)
+
+        # Pre-rendered header and brush controls, redrawn only when they change
+        self.ui_layer = UILayer(AirConfig.CANVAS_WIDTH, AirConfig.CANVAS_HEIGHT, AirConfig.HEADER_HEIGHT)
+
+        # Set default header
+        self.current_overlay_key = "red"
+        self.header = self.overlays.get("red")
+        if self.header is None:
+            # Fall back to first available overlay if default not found
+            for key in AirConfig.overlay_paths:
+                if key in self.overlays:
+                    self.current_overlay_key = key
+                    self.header = self.overlays[key]
+                    print(f"Default overlay not found, using '{key}' instead")
+                    break
+
+        if self.header is None:
+            print("WARNING: No overlay images loaded!")
+            # Create basic header if no images are available
+            basic_header = np.zeros((AirConfig.HEADER_HEIGHT, AirConfig.CANVAS_WIDTH, 3), dtype=np.uint8)
+            basic_header[:, :] = (50, 50, 50)  # Dark gray background
+            self.overlays["red"] = basic_header
+            self.header = basic_header
+            self.current_overlay_key = "red"
+
+        # Debug info
+        if AirConfig.debug_mode:
+            for key, overlay in self.overlays.loaded().items():
+                print(f"Overlay '{key}' shape: {overlay.shape}")
+
+    # Settings of the active cursor
+    @property
+    def draw_color(self):
+        return self.cursor.draw_color
+
+    @draw_color.setter
+    def draw_color(self, color):
+        self.cursor.draw_color = color
+
+    @property
+    def brush_thickness(self):
+        return self.cursor.brush_thickness
+
+    @brush_thickness.setter
+    def brush_thickness(self, thickness):
+        self.cursor.brush_thickness = thickness
+
+    @property
+    def eraser_mode(self):
+        return self.cursor.eraser_mode
+
+    @eraser_mode.setter
+    def eraser_mode(self, eraser_mode):
+        self.cursor.eraser_mode = eraser_mode
+
+    @property
+    def current_overlay_key(self):
+        return self.cursor.current_overlay_key
+
+    @current_overlay_key.setter
+    def current_overlay_key(self, key):
+        self.cursor.current_overlay_key = key
+
+    @property
+    def header(self):
+        return self.cursor.header
+
+    @header.setter
+    def header(self, header):
+        self.cursor.header = header
+
+    # Canvas rectangle covered by removed or erased stroke records, as they were before (None if nothing visible was removed)
+    def removed_rect(self, removed):
+        dirty_rect = None
+        for stroke in StrokeStore.to_tuples(removed[~removed["is_eraser"]]):
+            dirty_rect = self.canvas_layer.union_rect(dirty_rect, self.canvas_layer.stroke_rect(stroke))
+        return dirty_rect
+
+    # Redraw a dirty canvas region using only the strokes indexed near it, in time order
+    def redraw_canvas_region(self, dirty_rect):
+        if dirty_rect is None:
+            return
+        nearby = self.strokes.get(self.strokes.query(dirty_rect))
+        self.canvas_layer.redraw_region(dirty_rect, StrokeStore.to_tuples(nearby[~nearby["is_eraser"]]))
+
+    # Clear the canvas. With a label (and autosave_sessions) the strokes are saved first.
+    def clear_strokes(self, label = None):
+        if label is not None and AirConfig.autosave_sessions:
+            self.save_canvas_session(label)
+        self.strokes.clear()
+        self.canvas_layer.clear()
+
+    # Save the strokes as a new session file, optionally with PNG and SVG renders of the canvas.
+    # Only copies are taken here, the files are written on the session writer thread.
+    # Returns the session path, or None if there is nothing to save.
+    def save_canvas_session(self, label = "snapshot", export = False):
+        records = self.strokes.items()[1]
+        if len(records) == 0:
+            return None
+        path = session_path(AirConfig.session_folder, label)
+        base = os.path.splitext(path)[0] # exports share the session's name
+        self.session_writer.submit(save_session, path, records, (AirConfig.CANVAS_WIDTH, AirConfig.CANVAS_HEIGHT))
+        if export:
+            self.session_writer.submit(export_png, base + ".png", self.canvas_layer.img_canvas.copy())
+            self.session_writer.submit(self.export_svg, base + ".svg", records)
+        if AirConfig.max_sessions:
+            self.session_writer.submit(prune_sessions, AirConfig.session_folder, AirConfig.max_sessions)
+        print(f"Saving session to {path}")
+        return path
+
+    # SVG render of stroke records (runs on the session writer thread)
+    def export_svg(self, path, records):
+        runs = self.canvas_layer.polyline_runs(StrokeStore.to_tuples(records[~records["is_eraser"]]))
+        export_svg(path, runs, AirConfig.CANVAS_WIDTH, AirConfig.CANVAS_HEIGHT)
+
+    # Replace the strokes with a saved session ("latest" loads the newest one in session_folder).
+    # Stroke times are shifted so the newest loaded stroke counts as drawn now, the session then
+    # expires like freshly drawn strokes.
+    def load_canvas_session(self, path):
+        if path == "latest":
+            path = latest_session(AirConfig.session_folder)
+            if path is None:
+                print(f"No saved session in {AirConfig.session_folder}")
+                return False
+        records, canvas_size = load_session(path)
+        if canvas_size is not None and canvas_size != (AirConfig.CANVAS_WIDTH, AirConfig.CANVAS_HEIGHT):
+            print(f"WARNING: Session {path} was drawn on a {canvas_size[0]}x{canvas_size[1]} canvas")
+
+        self.clear_strokes()
+        if len(records):
+            records["t_stamp"] += time.time() - records["t_stamp"].max()
+            self.strokes.extend(records)
+            self.next_path_id = max(self.next_path_id, int(records["path_id"].max()) + 1)
+            drawn = records[~records["is_eraser"]]
+            buckets = np.floor_divide(drawn["t_stamp"], AirConfig.BUCKET_SECONDS).astype(np.int64)
+            runs_by_bucket = {}
+            for bucket in np.unique(buckets).tolist():
+                part = drawn[buckets == bucket]
+                runs_by_bucket[bucket] = self.canvas_layer.runs_from_arrays(part["x1"], part["y1"], part["x2"], part["y2"],
+                                                                            part["color"].astype(np.int64), part["thickness"], part["path_id"])
+            self.canvas_layer.draw_layers(runs_by_bucket)
+        print(f"Loaded {len(records)} strokes from {path}")
+        return True
+
+    # Finish pending session writes, the metrics log and profiling
+    def close(self):
+        self.session_writer.close()
+        if self.metrics_log is not None:
+            self.metrics_log.write(self.metrics_snapshot())
+            self.metrics_log.close()
+        if self.profiler is not None:
+            self.profiler.finish()
+
+    # Add the segment from the cursor's previous point to (x, y) and draw it. Segments of one
+    # continuous line share a path id, so they are redrawn as one polyline. A point that keeps
+    # the line straight (the previous point lies within simplify_tolerance of the line from the
+    # previous segment's start to the new point) extends the previous segment instead.
+    def add_segment(self, cursor, x, y, current_time):
+        xp, yp = cursor.xp, cursor.yp
+        last = self.strokes.get([cursor.stroke_id]) if cursor.stroke_id is not None else []
+        path_id = None
+        if len(last) and (last["x2"][0], last["y2"][0]) == (xp, yp) and tuple(last["color"][0]) == tuple(cursor.draw_color) \
+                and last["thickness"][0] == cursor.brush_thickness:
+            path_id = int(last["path_id"][0])
+            ax, ay = int(last["x1"][0]), int(last["y1"][0])
+            length = math.hypot(x - ax, y - ay)
+            straight = (xp - ax) * (x - xp) + (yp - ay) * (y - yp) > 0 and \
+                abs((xp - ax) * (y - ay) - (yp - ay) * (x - ax)) <= AirConfig.simplify_tolerance * length
+            if straight and length <= AirConfig.max_merged_length:
+                self.strokes.move_end(cursor.stroke_id, x, y)
+                self.canvas_layer.draw_stroke((xp, yp, x, y, cursor.draw_color, cursor.brush_thickness, float(last["t_stamp"][0])))
+                return
+
+        if path_id is None:
+            path_id = self.next_path_id
+            self.next_path_id += 1
+        cursor.stroke_id = self.strokes.append(xp, yp, x, y, cursor.draw_color, cursor.brush_thickness, current_time, path_id=path_id)
+        self.canvas_layer.draw_stroke((xp, yp, x, y, cursor.draw_color, cursor.brush_thickness, current_time))
+
+    # Apply the gestures of every hand in the current frame.
+    # landmarks: (hands, 21, 3) [id, x, y] array, fingers: (hands, 5) array of fingers up,
+    # handedness: "Left"/"Right" label per hand or None. processed_frame is annotated with the cursor feedback.
+    def update(self, processed_frame, landmarks, fingers, handedness, current_time):
+        hand_ids = self.tracker.update(landmarks, handedness, current_time)
+
+        # Smooth the landmarks of every hand, extrapolated over the pipeline latency
+        if self.landmark_filter is not None:
+            self.landmark_filter.forget(lambda hand_id: hand_id in self.tracker)
+            lead = min(self.latency, AirConfig.max_prediction) if AirConfig.filter_prediction else 0.0
+            landmarks = self.landmark_filter.apply(hand_ids, landmarks, current_time, lead)
+
+        # Forget the cursors of hands that are gone, hands missing from this frame lift their pen
+        for hand_id in list(self.cursors):
+            if hand_id not in self.tracker:
+                del self.cursors[hand_id]
+            elif hand_id not in hand_ids:
+                self.cursors[hand_id].xp, self.cursors[hand_id].yp = 0, 0
+
+        if hand_ids:
+            # Hand detected, update last detection time
+            self.last_hand_detection_time = current_time
+
+            for hand_id, lm_list, hand_fingers in zip(hand_ids, landmarks.tolist(), fingers.tolist()):
+                cursor = self.cursors.get(hand_id)
+                if cursor is None:
+                    if any(held is self.cursor for held in self.cursors.values()):
+                        # Further hands start with a copy of the active brush settings
+                        cursor = self.cursor.copy()
+                    else:
+                        # The active cursor is free: the hand takes it over, so keyboard changes reach it
+                        cursor = self.cursor
+                        cursor.reset()
+                    self.cursors[hand_id] = cursor
+                self.update_hand(processed_frame, cursor, lm_list, hand_fingers, current_time)
+
+        # No landmarks detected
+        else:
+            # Check if hand has been absent for more than timeout period
+            time_since_last_hand = current_time - self.last_hand_detection_time
+            if time_since_last_hand >= AirConfig.hand_timeout and len(self.strokes) > 0:
+                # Clear canvas after timeout
+                self.clear_strokes("timeout")
+                print(f"Canvas cleared after {time_since_last_hand:.1f} seconds with no hand detected")
+
+    # Apply the gesture of one hand: color/brush selection, drawing or erasing with its cursor
+    def update_hand(self, processed_frame, cursor, lm_list, fingers, current_time):
         # Get landmark positions for index (lm8) and middle fingers (lm12)
         x1, y1 = lm_list[8][1:]
-        fingers = detector.fingers_up()
-        
-        # If both index and middle fingers are up, reset drawing and check for header/color selection
-        if fingers[1] and fingers[2]:
-            xp, yp = 0, 0 # Reset to previous point
-            cv2.rectangle(processed_frame, (x1, y1 - 15), (lm_list[12][1], lm_list[12][2] + 25), draw_color, cv2.FILLED)
-            
-            # Check if finger is in header area
-            if y1 < AirConfig.HEADER_HEIGHT:
-                # Check which color region finger is touching
-                for region in AirConfig.color_regions:
-                    x_min, x_max, y_min, y_max, color_name, color_value = region
-                    if x_min <= x1 <= x_max and y_min <= y1 <= y_max:
-                        if color_name in overlays:
-                            header = overlays[color_name]
-                            current_overlay_key = color_name
-                            draw_color = color_value
-                            eraser_mode = (color_name == "eraser")
-                            print(f"Changed to {color_name}, color: {color_value}")
-                            break
-            
-            # Check if finger is in brush size control area (right side of screen)
-            elif AirConfig.CANVAS_WIDTH-70 <= x1 <= AirConfig.CANVAS_WIDTH-20 and 200 <= y1 <= 320:
-                for region in AirConfig.brush_control_regions:
-                    x_min, x_max, y_min, y_max, action = region
-                    if x_min <= x1 <= x_max and y_min <= y1 <= y_max:
-                        if action == "increase" and brush_thickness < 100:
-                            brush_thickness += 5
-                            print(f"Brush thickness increased to: {brush_thickness}")
-                        elif action == "decrease" and brush_thickness > 5:
-                            brush_thickness -= 5
-                            print(f"Brush thickness decreased to: {brush_thickness}")
-                        # Wait a moment to prevent multiple rapid changes
-                        time.sleep(0.3)
-                            
-        # If index finger is up and middle finger is down Draw    
-        elif fingers[1] and not fingers[2]:
+        gesture = self.gestures.classify(fingers)
+
+        # Selection gesture (index and middle fingers up): reset drawing and check for header/brush button selection
+        if gesture == "select":
+            cursor.xp, cursor.yp = 0, 0 # Reset to previous point
+            cv2.rectangle(processed_frame, (x1, y1 - 15), (lm_list[12][1], lm_list[12][2] + 25), cursor.draw_color, cv2.FILLED)
+
+            # Button under the fingertip, selected once the fingertip stayed on it for select_dwell
+            # seconds (brush buttons repeat while held)
+            target = self.hit_map.lookup(x1, y1)
+            repeat = AirConfig.brush_repeat_interval if target is not None and target[0] == "brush" else None
+            action = cursor.dwell.update(target, current_time, repeat)
+            if action is not None:
+                self.apply_button(cursor, action)
+            return
+        cursor.dwell.reset()
+
+        # Drawing gesture (index finger up, middle finger down)
+        if gesture == "draw":
             # Choose circle size based on eraser mode
-            circle_radius = 25 if eraser_mode else 15
-            
+            circle_radius = 25 if cursor.eraser_mode else 15
+
             # Visual feedback for current position
-            if eraser_mode:
+            if cursor.eraser_mode:
                 # White circle with border for eraser
                 cv2.circle(processed_frame, (x1, y1), circle_radius+2, (0, 0, 0), 2)
                 cv2.circle(processed_frame, (x1, y1), circle_radius, (255, 255, 255), cv2.FILLED)
             else:
-                cv2.circle(processed_frame, (x1, y1), circle_radius, draw_color, cv2.FILLED)
-                
+                cv2.circle(processed_frame, (x1, y1), circle_radius, cursor.draw_color, cv2.FILLED)
+
+            xp, yp = cursor.xp, cursor.yp
             if xp == 0 and yp == 0:
                 # Initialize (no drawing yet)
-                xp, yp = x1, y1
+                cursor.xp, cursor.yp = x1, y1
             else:
+                moved = True
                 # Draw if valid previous position
                 # Ensures drawing does not start at (0, 0)
-                if abs(x1 - xp) + abs(y1 - yp) < 100: # Prevents large jumps in pixels
+                if (x1 - xp) ** 2 + (y1 - yp) ** 2 < AirConfig.max_stroke_jump ** 2: # Prevents large jumps in pixels
                     # Only create strokes for non-header area
                     if y1 > AirConfig.HEADER_HEIGHT or yp > AirConfig.HEADER_HEIGHT:
-                        if eraser_mode:
-                            # Instead of creating special eraser strokes, directly remove
-                            # any existing strokes that intersect with this eraser movement
-                            eraser_thickness = brush_thickness * AirConfig.eraser_brush_multiplier
-                            to_remove = []
-                            
-                            for idx, existing_stroke in enumerate(strokes):
-                                if len(existing_stroke) == 8:
-                                    s_x1, s_y1, s_x2, s_y2, s_color, s_thickness, s_time, s_is_eraser = existing_stroke
-                                else:
-                                    s_x1, s_y1, s_x2, s_y2, s_color, s_thickness, s_time = existing_stroke
-                                    s_is_eraser = False
-                                
-                                # Skip eraser strokes - no need to erase erasers
-                                if s_is_eraser:
-                                    continue
-                                
-                                # Calculate distance from line (eraser) to line (stroke)
-                                # Simple bounding box collision
-                                eraser_margin = eraser_thickness + s_thickness
-                                
-                                # Current eraser bounding box
-                                eraser_min_x = min(xp, x1) - eraser_margin
-                                eraser_max_x = max(xp, x1) + eraser_margin
-                                eraser_min_y = min(yp, y1) - eraser_margin
-                                eraser_max_y = max(yp, y1) + eraser_margin
-                                
-                                # Stroke bounding box
-                                stroke_min_x = min(s_x1, s_x2) - eraser_margin
-                                stroke_max_x = max(s_x1, s_x2) + eraser_margin
-                                stroke_min_y = min(s_y1, s_y2) - eraser_margin
-                                stroke_max_y = max(s_y1, s_y2) + eraser_margin
-                                
-                                # Check for collision
-                                if not (stroke_max_x < eraser_min_x or stroke_min_x > eraser_max_x or 
-                                        stroke_max_y < eraser_min_y or stroke_min_y > eraser_max_y):
-                                    to_remove.append(idx)
-                            
-                            # Remove collided strokes in reverse order (to maintain indices)
-                            for idx in sorted(to_remove, reverse=True):
-                                if idx < len(strokes):
-                                    strokes.pop(idx)
+                        if cursor.eraser_mode:
+                            # Instead of creating special eraser strokes, directly erase the parts
+                            # of existing strokes within reach of this eraser movement
+                            eraser_thickness = cursor.brush_thickness * AirConfig.eraser_brush_multiplier
+                            erased = self.strokes.erase(xp, yp, x1, y1, eraser_thickness)
+
+                            # Rebuild only the area the erased strokes covered
+                            self.redraw_canvas_region(self.removed_rect(erased))
+                        elif (x1 - xp) ** 2 + (y1 - yp) ** 2 < AirConfig.min_segment_length ** 2:
+                            # Finger (almost) still, keep the previous point until it moved far enough
+                            moved = False
                         else:
-                            # Normal drawing - add stroke
-                            strokes.append((xp, yp, x1, y1, draw_color, brush_thickness, current_time, False))
-                xp, yp = x1, y1
-        else:
-            xp, yp = 0, 0
-    
-    # No landmarks detected reset drawing to starting point (if applicable)
-    else:
-        xp, yp = 0, 0
-        
-        # Check if hand has been absent for more than timeout period
-        time_since_last_hand = current_time - last_hand_detection_time
-        if time_since_last_hand >= AirConfig.hand_timeout and len(strokes) > 0:
-            # Clear canvas after timeout
-            strokes = []
-            print(f"Canvas cleared after {time_since_last_hand:.1f} seconds with no hand detected")
-    
-    # Create new canvas and redraw strokes that have not expired
-    img_canvas = np.zeros((AirConfig.CANVAS_HEIGHT, AirConfig.CANVAS_WIDTH, 3), np.uint8)
-    
-    # First pass: identify eraser strokes
-    eraser_strokes = []
-    for i, stroke in enumerate(strokes):
-        # Check if it has eraser flag
-        if len(stroke) == 8:
-            x_start, y_start, x_end, y_end, color, thickness, t_stamp, is_eraser = stroke
-        else:
-            # Backward compatibility
-            x_start, y_start, x_end, y_end, color, thickness, t_stamp = stroke
-            is_eraser = False
-            
-        if is_eraser and current_time - t_stamp <= AirConfig.STROKE_LIFETIME:
-            eraser_strokes.append((x_start, y_start, x_end, y_end, thickness))
-    
-    # Second pass: draw non-erased strokes
-    new_strokes = []
-    for stroke in strokes:
-        # Handle both formats (with or without eraser flag)
-        if len(stroke) == 8:
-            x_start, y_start, x_end, y_end, color, thickness, t_stamp, is_eraser = stroke
+                            # Normal drawing - add stroke and draw only the new segment
+                            self.add_segment(cursor, x1, y1, current_time)
+                if moved:
+                    cursor.xp, cursor.yp = x1, y1
         else:
-            x_start, y_start, x_end, y_end, color, thickness, t_stamp = stroke
-            is_eraser = False
-            
-        # Skip drawing eraser strokes 
-        if is_eraser:
+            cursor.xp, cursor.yp = 0, 0
+
+    # Apply a color or brush button selected by a cursor
+    def apply_button(self, cursor, action):
+        if action[0] == "color":
+            _, color_name, color_value = action
+            if color_name in self.overlays:
+                cursor.header = self.overlays[color_name]
+                cursor.current_overlay_key = color_name
+                cursor.draw_color = color_value
+                cursor.eraser_mode = (color_name == "eraser")
+                self.cursor = cursor # header shows the hand that selected last
+                print(f"Changed to {color_name}, color: {color_value}")
+        elif action[0] == "brush":
+            self.cursor = cursor
+            if action[1] == "increase" and cursor.brush_thickness < 100:
+                cursor.brush_thickness += 5
+                print(f"Brush thickness increased to: {cursor.brush_thickness}")
+            elif action[1] == "decrease" and cursor.brush_thickness > 5:
+                cursor.brush_thickness -= 5
+                print(f"Brush thickness decreased to: {cursor.brush_thickness}")
+
+    # Bring the canvas up to date (expiry and eraser strokes) and return the canvas
+    def render_canvas(self, current_time):
+        # Drop the time buckets of strokes that have expired together with their canvas layers
+        # (the canvas is recomposited from the remaining layers, no stroke is redrawn)
+        self.strokes.expire(current_time, AirConfig.STROKE_LIFETIME)
+        self.canvas_layer.expire(current_time, AirConfig.STROKE_LIFETIME)
+        if AirConfig.fade_seconds > 0:
+            self.fade_layers(current_time)
+        dirty_rect = None
+
+        # Eraser strokes (only found in sessions saved by older versions) erase the parts of
+        # strokes they reach and are then discarded
+        eraser_ids = self.strokes.eraser_ids()
+        if len(eraser_ids):
+            for eraser in StrokeStore.to_tuples(self.strokes.get(eraser_ids)):
+                e_x_start, e_y_start, e_x_end, e_y_end, _, e_thickness = eraser[:6]
+                erased = self.strokes.erase(e_x_start, e_y_start, e_x_end, e_y_end, e_thickness)
+                dirty_rect = self.canvas_layer.union_rect(dirty_rect, self.removed_rect(erased))
+            self.strokes.remove(eraser_ids)
+
+        # Rebuild the dirty region from the surviving strokes
+        self.redraw_canvas_region(dirty_rect)
+        return self.canvas_layer.img_canvas
+
+    # Dim the layers of buckets that expire within fade_seconds, in fade_steps brightness steps
+    def fade_layers(self, current_time):
+        bucket_seconds = AirConfig.BUCKET_SECONDS
+        for bucket in self.canvas_layer.layer_order:
+            remaining = (bucket + 1) * bucket_seconds + AirConfig.STROKE_LIFETIME - current_time
+            if remaining >= AirConfig.fade_seconds:
+                break
+            brightness = math.ceil(max(remaining, 0.0) / AirConfig.fade_seconds * AirConfig.fade_steps) / AirConfig.fade_steps
+            self.canvas_layer.set_fade(bucket, brightness)
+
+    # Merge the canvas with the camera frame and draw the UI on top.
+    # processed_frame is used as the output buffer.
+    def compose(self, processed_frame, img_canvas, landmarks, current_time):
+        # Merge drawings with camera frame, in place using the canvas coverage mask
+        final_img = self.canvas_layer.composite(processed_frame)
+
+        # Apply the header overlay and brush size controls
+        self.ui_layer.apply(final_img, (self.current_overlay_key, self.brush_thickness), self.header, self.brush_thickness)
+
+        if self.show_hud and self.hud_panel is not None:
+            draw_hud(final_img, self.hud_panel)
+
+        # Show hand timeout indicator if no hand is detected
+        if len(landmarks) == 0 and AirConfig.show_countdown:
+            time_since_last_hand = current_time - self.last_hand_detection_time
+            if time_since_last_hand > 0 and time_since_last_hand < AirConfig.hand_timeout:
+                # Show countdown
+                remaining = AirConfig.hand_timeout - time_since_last_hand
+                cv2.putText(final_img, f"Auto-clear in: {remaining:.1f}s", (20, AirConfig.CANVAS_HEIGHT-30),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+        return final_img
+
+    # Full per-frame logic after hand detection, returns the image to display.
+    # frame_time is when inference on the frame started, used to measure the latency to predict over.
+    def process(self, processed_frame, landmarks, fingers, handedness, frame_time = None):
+        if self.profiler is not None:
+            self.profiler.frame()
+        current_time = time.time()
+        if frame_time is not None:
+            self.latency = 0.9 * self.latency + 0.1 * (current_time - frame_time)
+        metrics = self.metrics
+        start = time.perf_counter()
+        self.update(processed_frame, landmarks, fingers, handedness, current_time)
+        updated = time.perf_counter()
+        img_canvas = self.render_canvas(current_time)
+        rendered = time.perf_counter()
+        final_img = self.compose(processed_frame, img_canvas, landmarks, current_time)
+        composed = time.perf_counter()
+        metrics.record("update", updated - start)
+        metrics.record("render", rendered - updated)
+        metrics.record("compose", composed - rendered)
+        metrics.frame(len(landmarks))
+        self.report_metrics(composed)
+        return final_img
+
+    # Metrics snapshot including the current stroke count and latency
+    def metrics_snapshot(self):
+        self.metrics.set("strokes", len(self.strokes))
+        self.metrics.set("latency_ms", round(self.latency * 1000.0, 1))
+        return self.metrics.snapshot()
+
+    # Refresh the HUD text (twice per second) and write the metrics log when due
+    def report_metrics(self, now):
+        hud_due = self.show_hud and (self.hud_time is None or now - self.hud_time >= 0.5)
+        log_due = self.metrics_log is not None and self.metrics_log.due(now)
+        if not (hud_due or log_due):
+            return
+        values = self.metrics_snapshot()
+        if hud_due:
+            self.hud_panel = hud_panel(hud_lines(values))
+            self.hud_time = now
+        if log_due:
+            self.metrics_log.write(values, now)
+
+    # Key controls, returns False when the application should quit
+    def handle_key(self, key):
+        if key == ord('q'):
+            return False
+        elif key == ord('c'):
+            try:
+                current_index = color_options.index(self.draw_color)
+            except ValueError:
+                current_index = 0
+
+            # Update color
+            new_index = (current_index + 1) % len(color_options)
+            self.draw_color = color_options[new_index]
+
+            # Update overlay based on new color
+            if new_index == 0 and "red" in self.overlays:  # Red
+                self.header = self.overlays["red"]
+                self.current_overlay_key = "red"
+                self.eraser_mode = False
+            elif new_index == 1 and "blue" in self.overlays:  # Blue
+                self.header = self.overlays["blue"]
+                self.current_overlay_key = "blue"
+                self.eraser_mode = False
+            elif new_index == 2 and "green" in self.overlays:  # Green
+                self.header = self.overlays["green"]
+                self.current_overlay_key = "green"
+                self.eraser_mode = False
+            elif new_index == 3 and "eraser" in self.overlays:  # Eraser
+                self.header = self.overlays["eraser"]
+                self.current_overlay_key = "eraser"
+                self.eraser_mode = True
+
+            print(f"Color changed to: {self.draw_color}, mode: {self.current_overlay_key}")
+
+        # Use 'x' to clear canvas
+        elif key == ord('x'):
+            self.clear_strokes("cleared")
+        # Use 's' to save the session with PNG and SVG exports
+        elif key == ord('s'):
+            self.save_canvas_session("snapshot", export=True)
+        # Use 'm' to show or hide the metrics HUD
+        elif key == ord('m'):
+            self.show_hud = not self.show_hud
+            self.hud_time = None
+        elif key == ord('+') and self.brush_thickness < 100:
+            self.brush_thickness += 5
+            print(f"Brush thickness increased to: {self.brush_thickness}")
+        elif key == ord('-') and self.brush_thickness > 1:
+            self.brush_thickness -= 5
+            print(f"Brush thickness decreased to: {self.brush_thickness}")
+        elif 48 <= key <= 57:
+            self.pressed_keys.append(key - 48)
+
+            if len(self.pressed_keys) == 9:
+                # Three digits per channel can go up to 999, channels are clamped to 255
+                blue = min(int(''.join(map(str, self.pressed_keys[:3]))), 255)
+                green = min(int(''.join(map(str, self.pressed_keys[3:6]))), 255)
+                red = min(int(''.join(map(str, self.pressed_keys[6:9]))), 255)
+                self.draw_color = (blue, green, red)
+                self.eraser_mode = False  # Custom colors are not eraser
+                print("Color is set to:", self.draw_color)
+                self.pressed_keys = []
+        return True
+
+
+# Capture stage: grab a frame from the source, mirror it and resize it to the canvas size
+def capture_frame(source):
+    # Capture frame from camera
+    frame = source.read()
+    if frame is None:
+        if not source.finished:
+            print("No frame captured")
+        return None
+    return prepare_frame(frame)
+
+
+def prepare_frame(frame):
+    # Flip frame for mirror effect
+    frame = cv2.flip(frame, 1)
+
+    # Resize to ensure frame is the predetermined canvas width and height
+    if frame.shape[1] != AirConfig.CANVAS_WIDTH or frame.shape[0] != AirConfig.CANVAS_HEIGHT:
+        frame = cv2.resize(frame, (AirConfig.CANVAS_WIDTH, AirConfig.CANVAS_HEIGHT))
+    return frame
+
+
+# Hand detector configured from AirConfig and the landmark trace command line options
+def create_detector(args):
+    # Skip inference while nothing is happening (idle probe, reuse of still landmarks)
+    scheduler = None
+    if AirConfig.adaptive_detection:
+        scheduler = DetectionScheduler(AirConfig.idle_probe_rate, (AirConfig.IDLE_PROBE_WIDTH, AirConfig.IDLE_PROBE_HEIGHT),
+                                       AirConfig.motion_threshold, AirConfig.max_reused_frames, AirConfig.idle_delay)
+
+    # Initialize hand detector with robust confidence threshold
+    return HandDetectorMP(max_hands = AirConfig.max_hands, detection_con = AirConfig.detection_confidence, track_con = AirConfig.tracking_confidence,
+                          inference_size = (AirConfig.INFERENCE_WIDTH, AirConfig.INFERENCE_HEIGHT),
+                          trace_path = args.replay_landmarks, record_path = args.record_landmarks,
+                          loop_trace = args.loop_landmarks, scheduler = scheduler,
+                          roi_size = AirConfig.ROI_SIZE if AirConfig.roi_inference else None,
+                          roi_padding = AirConfig.roi_padding, roi_full_interval = AirConfig.roi_full_interval,
+                          use_worker = AirConfig.inference_worker, worker_slots = AirConfig.worker_slots,
+                          worker_frame_size = (AirConfig.CANVAS_WIDTH, AirConfig.CANVAS_HEIGHT))
+
+
+# Inference stage: run hand detection on a frame.
+# Returns (processed_frame, landmarks, fingers, handedness, frame_time) for the compositing stage,
+# with the landmarks and fingers of all hands computed in one pass. frame_time is when the frame the
+# landmarks come from arrived (an earlier frame with the inference worker). The inference time and
+# the detector's mode for the frame are recorded in metrics, when given.
+def detect_hands(detector, frame, metrics = None):
+    start = time.perf_counter()
+    # Process hand detection on current frame (frame is annotated and later composited in place)
+    processed_frame = detector.find_hands(frame)
+    landmarks = detector.find_landmarks(processed_frame)
+    fingers = detector.all_fingers_up()
+    if metrics is not None:
+        metrics.record("inference", time.perf_counter() - start)
+        metrics.count(f"{detector.last_mode}_frames")
+    return processed_frame, landmarks, fingers, detector.handedness(), detector.points_time
+
+
+# Outputs configured in AirConfig: the window (unless headless), video recording and MJPEG stream
+def create_outputs():
+    sinks = []
+    if AirConfig.record_video:
+        sinks.append(VideoRecorder(AirConfig.record_video, AirConfig.record_fps, AirConfig.record_codec))
+    if AirConfig.stream_port is not None:
+        sinks.append(MJPEGServer(AirConfig.stream_port, AirConfig.stream_host, AirConfig.stream_quality, AirConfig.stream_width))
+    window = WindowSink("Canvas") if AirConfig.display_window else None
+    return OutputSinks(sinks, window)
+
+
+# Hand the final image to every output, returns False when the application should quit
+def output_frame(app, outputs, final_img):
+    outputs.write(final_img)
+    app.metrics.set("output_dropped", outputs.dropped)
+    return app.handle_key(outputs.poll_key())
+
+
+# Synchronous main loop: capture, inference and display one after another
+def run_synchronous(app, detector, source, outputs):
+    dropped_frames = 0
+    while True:
+        frame = capture_frame(source)
+        if frame is None:
+            if source.finished:
+                break
+            dropped_frames += 1
+            app.metrics.set("dropped_frames", dropped_frames)
             continue
-            
-        # Check if stroke has expired
-        if current_time - t_stamp <= AirConfig.STROKE_LIFETIME:
-            # Check if this stroke was erased
-            erased = False
-            for e_x_start, e_y_start, e_x_end, e_y_end, e_thickness in eraser_strokes:
-                # Simplified collision detection using bounding boxes
-                eraser_margin = e_thickness + thickness
-                
-                # Bounding boxes for stroke and eraser
-                stroke_min_x = min(x_start, x_end) - eraser_margin
-                stroke_max_x = max(x_start, x_end) + eraser_margin
-                stroke_min_y = min(y_start, y_end) - eraser_margin
-                stroke_max_y = max(y_start, y_end) + eraser_margin
-                
-                eraser_min_x = min(e_x_start, e_x_end) - eraser_margin
-                eraser_max_x = max(e_x_start, e_x_end) + eraser_margin
-                eraser_min_y = min(e_y_start, e_y_end) - eraser_margin
-                eraser_max_y = max(e_y_start, e_y_end) + eraser_margin
-                
-                # Check for collision
-                if not (stroke_max_x < eraser_min_x or stroke_min_x > eraser_max_x or 
-                        stroke_max_y < eraser_min_y or stroke_min_y > eraser_max_y):
-                    erased = True
+
+        final_img = app.process(*detect_hands(detector, frame, app.metrics))
+
+        # Display final image
+        if not output_frame(app, outputs, final_img):
+            break
+
+
+# Pipelined main loop: capture and inference run on their own threads while this
+# thread composites and displays the latest inference result
+def run_pipelined(app, detector, source, outputs):
+    pipeline = FramePipeline(lambda: capture_frame(source), lambda frame: detect_hands(detector, frame, app.metrics),
+                             AirConfig.pipeline_queue_size, is_finished=lambda: source.finished).start()
+    try:
+        while not pipeline.finished:
+            result = pipeline.get(timeout=0.1)
+            if result is None:
+                # Keep the window responsive while waiting for a frame
+                if not app.handle_key(outputs.poll_key()):
                     break
-                    
-            # Draw and keep non-erased strokes
-            if not erased:
-                # Only draw below header area
-                if y_start > AirConfig.HEADER_HEIGHT or y_end > AirConfig.HEADER_HEIGHT:
-                    cv2.line(img_canvas, (x_start, y_start), (x_end, y_end), color, thickness)
-                new_strokes.append(stroke)
-    
-    # Update strokes list
-    strokes = new_strokes
-    
-    # Ensure canvas is type uint8 before conversion
-    img_canvas = img_canvas.astype(np.uint8)
-    
-    # Convert drawing canvas to mask
-    img_gray = cv2.cvtColor(img_canvas, cv2.COLOR_BGR2GRAY)
-    _, img_inv = cv2.threshold(img_gray, 50, 255, cv2.THRESH_BINARY_INV)
-    img_inv = cv2.cvtColor(img_inv, cv2.COLOR_GRAY2BGR)
-    
-    # Merge drawings with camera frame
-    final_img = cv2.bitwise_and(processed_frame, img_inv)
-    final_img = cv2.bitwise_or(final_img, img_canvas)
-    
-    # Apply current overlay header
-    if header is not None and header.shape[0] == AirConfig.HEADER_HEIGHT and header.shape[1] == AirConfig.CANVAS_WIDTH:
-        final_img[0:AirConfig.HEADER_HEIGHT, 0:AirConfig.CANVAS_WIDTH] = header
-    
-    # Add a visible boundary line to show where header ends
-    cv2.line(final_img, (0, AirConfig.HEADER_HEIGHT), (AirConfig.CANVAS_WIDTH, AirConfig.HEADER_HEIGHT), (0, 0, 0), 3)
-    cv2.line(final_img, (0, AirConfig.HEADER_HEIGHT), (AirConfig.CANVAS_WIDTH, AirConfig.HEADER_HEIGHT), (255, 255, 255), 1)
-    
-    # Draw brush size controls on right side, vertically stacked
-    # Plus button (top)
-    cv2.rectangle(final_img, (AirConfig.CANVAS_WIDTH-70, 200), (AirConfig.CANVAS_WIDTH-20, 250), (50, 50, 50), cv2.FILLED)
-    cv2.putText(final_img, "+", (AirConfig.CANVAS_WIDTH-55, 235), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
-    
-    # Minus button (bottom)
-    cv2.rectangle(final_img, (AirConfig.CANVAS_WIDTH-70, 270), (AirConfig.CANVAS_WIDTH-20, 320), (50, 50, 50), cv2.FILLED)
-    cv2.putText(final_img, "-", (AirConfig.CANVAS_WIDTH-55, 305), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
-    
-    # Current brush size display (centered between buttons)
-    cv2.putText(final_img, f"{brush_thickness}", (AirConfig.CANVAS_WIDTH-55, 370), 
-                cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2)
-    
-    # Show hand timeout indicator if no hand is detected
-    if not lm_list and AirConfig.show_countdown:
-        time_since_last_hand = current_time - last_hand_detection_time
-        if time_since_last_hand > 0 and time_since_last_hand < AirConfig.hand_timeout:
-            # Show countdown
-            remaining = AirConfig.hand_timeout - time_since_last_hand
-            cv2.putText(final_img, f"Auto-clear in: {remaining:.1f}s", (20, AirConfig.CANVAS_HEIGHT-30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-    
-    # Display final image
-    cv2.imshow("Canvas", final_img)
-    
-    # Key controls
-    key = cv2.waitKey(1) & 0xFF 
-    if key == ord('q'):
-        break
-    elif key == ord('c'):
-        try:
-            current_index = color_options.index(draw_color)
-        except ValueError:
-            current_index = 0
-        
-        # Update color
-        new_index = (current_index + 1) % len(color_options)
-        draw_color = color_options[new_index]
-        
-        # Update overlay based on new color
-        if new_index == 0 and "red" in overlays:  # Red
-            header = overlays["red"]
-            current_overlay_key = "red"
-            eraser_mode = False
-        elif new_index == 1 and "blue" in overlays:  # Blue
-            header = overlays["blue"]
-            current_overlay_key = "blue"
-            eraser_mode = False
-        elif new_index == 2 and "green" in overlays:  # Green
-            header = overlays["green"]
-            current_overlay_key = "green"
-            eraser_mode = False
-        elif new_index == 3 and "eraser" in overlays:  # Eraser
-            header = overlays["eraser"]
-            current_overlay_key = "eraser"
-            eraser_mode = True
-                
-        print(f"Color changed to: {draw_color}, mode: {current_overlay_key}")
-        
-    # Use 'x' to clear canvas
-    elif key == ord('x'):
-        strokes = []
-    elif key == ord('+') and brush_thickness < 100:
-        brush_thickness += 5
-        print(f"Brush thickness increased to: {brush_thickness}")
-    elif key == ord('-') and brush_thickness > 1:
-        brush_thickness -= 5
-        print(f"Brush thickness decreased to: {brush_thickness}")
-    elif 48 <= key <= 57:
-        pressed_keys.append(key - 48)
-        
-        if len(pressed_keys) == 9:
-            blue = int(''.join(map(str, pressed_keys[:3])))
-            green = int(''.join(map(str, pressed_keys[3:6])))
-            red = int(''.join(map(str, pressed_keys[6:9])))
-            draw_color = (blue, green, red)
-            eraser_mode = False  # Custom colors are not eraser
-            print("Color is set to:", draw_color)
-            pressed_keys = []
-            
-picam2.stop()    
-cv2.destroyAllWindows()
+                continue
+
+            app.metrics.set("dropped_frames", pipeline.dropped_frames)
+            final_img = app.process(*result)
+
+            # Display final image
+            if not output_frame(app, outputs, final_img):
+                break
+    finally:
+        pipeline.stop()
+        if AirConfig.debug_mode:
+            print(f"Pipeline dropped {pipeline.dropped_frames} frames")
+
+
+# SIGTERM (e.g. from a service manager) stops the application like Ctrl+C, so the outputs,
+# the exit session and the metrics log are still finished and written
+def stop_on_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Draw in the air using hand gestures")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--pipeline", dest="pipeline", action="store_true", default=AirConfig.pipeline_mode,
+                      help="run capture, hand inference and display on separate threads")
+    mode.add_argument("--sync", dest="pipeline", action="store_false",
+                      help="run capture, hand inference and display one after another")
+    add_source_arguments(parser, AirConfig.frame_source)
+    add_trace_arguments(parser)
+    parser.add_argument("--load-session", metavar="SESSION",
+                        help="start from a saved session file ('latest' for the newest in the session folder)")
+    parser.add_argument("--metrics-log", metavar="LOG", help="write metrics to this .csv or .jsonl file (overrides AirConfig.metrics_log)")
+    parser.add_argument("--hud", action="store_true", help="show the metrics HUD")
+    parser.add_argument("--profile", type=int, default=0, metavar="FRAMES", help="profile the first FRAMES frames with cProfile")
+    parser.add_argument("--profile-output", default="aircanvas.prof", help="file the profile statistics are written to")
+    parser.add_argument("--headless", action="store_true", help="run without a window (stop with Ctrl+C or SIGTERM)")
+    parser.add_argument("--record-video", metavar="VIDEO", help="record the composed canvas to a video file")
+    parser.add_argument("--stream-port", type=int, metavar="PORT", help="serve the composed canvas as an MJPEG stream on this port")
+    args = parser.parse_args()
+    start_time = time.perf_counter()
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+
+    if args.headless:
+        AirConfig.display_window = False
+    if args.record_video:
+        AirConfig.record_video = args.record_video
+    if args.stream_port is not None:
+        AirConfig.stream_port = args.stream_port
+    if args.metrics_log:
+        AirConfig.metrics_log = args.metrics_log
+    if args.hud:
+        AirConfig.metrics_hud = True
+    app = AirCanvasApp()
+    if args.profile > 0:
+        app.profiler = FrameProfiler(args.profile, args.profile_output)
+    if args.load_session:
+        app.load_canvas_session(args.load_session)
+
+    # capture at default canvas width and height from config file. The camera is brought up
+    # on a second thread while the hand model loads (mediapipe is imported by the detector).
+    source = source_from_args(args, (AirConfig.CANVAS_WIDTH, AirConfig.CANVAS_HEIGHT))
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        source_started = executor.submit(source.start)
+        detector = create_detector(args)
+        source_started.result()
+
+    # Ready once the camera delivers frames and the model has run once (the first inference is the slowest)
+    frame = wait_for_frame(source, AirConfig.first_frame_timeout)
+    if frame is None:
+        print(f"WARNING: No frame from the {args.source} source within {AirConfig.first_frame_timeout} seconds")
+    else:
+        detector.warmup(prepare_frame(frame))
+    print(f"Ready in {time.perf_counter() - start_time:.2f} seconds")
+
+    # Main loop: constant capture/process frames
+    outputs = create_outputs()
+    try:
+        # Create named window for display (and start recording/streaming)
+        outputs.start()
+        for sink in outputs.sinks:
+            if isinstance(sink, MJPEGServer):
+                print(f"Streaming the canvas on http://{sink.host}:{sink.port}/") # the bound port (port 0 picks one)
+
+        if args.pipeline:
+            run_pipelined(app, detector, source, outputs)
+        else:
+            run_synchronous(app, detector, source, outputs)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.stop()
+        detector.close()
+        if AirConfig.autosave_sessions:
+            app.save_canvas_session("exit")
+        app.close()
+        outputs.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,45 @@ STROKE_LIFETIME = 30.0 # Lifetime in seconds of drawn pixels
 default_color = (0, 0, 255) # default red
 default_brush_thickness = 5
 eraser_brush_multiplier = 2 # Eraser size multiplied constant
+STROKE_CAPACITY = 4096 # Initial number of stroke segments preallocated (grows when full)
+SPATIAL_CELL_SIZE = 64 # Cell size in pixels of the grid used to look up strokes near the eraser
+BUCKET_SECONDS = 1.0 # Strokes drawn within the same window of this many seconds expire together (up to this much late)
+fade_seconds = 0.0 # Strokes fade out over their last seconds of lifetime (0 disables fading)
+fade_steps = 8 # Number of brightness steps of the fade (each step recomposites the faded area once)
 
 # Hand presence tracking
 detection_confidence = 0.85
 tracking_confidence = 0.5
 hand_timeout = 10  # seconds before clearing canvas when no hand detected
+INFERENCE_WIDTH = 640 # Frames are downscaled to this size for hand detection (landmarks are mapped back to canvas size)
+INFERENCE_HEIGHT = 360
+inference_worker = False # When true, MediaPipe runs in a separate process, frames are passed through shared memory
+worker_slots = 2 # Shared memory frame buffers of the inference worker (frames being inferred at once)
+roi_inference = True # When true, hand inference runs on a crop around the last detected hands
+ROI_SIZE = 256 # Crops are resized to this square size in pixels for inference
+roi_padding = 0.6 # Padding around the hands in the crop, as a fraction of the hand size on each side
+roi_full_interval = 15 # Frames between whole frame inferences while cropping (to find new hands)
+adaptive_detection = True # When true, hand inference is skipped or downscaled while no hand is present or the hand is still
+idle_probe_rate = 5.0 # Hand detection runs per second while no hand is present
+IDLE_PROBE_WIDTH = 320 # Frame size used for hand detection while no hand is present
+IDLE_PROBE_HEIGHT = 180
+idle_delay = 1.0 # seconds without a hand before switching to the idle probe rate
+motion_threshold = 3.0 # Mean gray level change around the hand below which the last landmarks are reused
+max_reused_frames = 5 # Most frames in a row that reuse the last landmarks instead of running inference
+landmark_filter = True # When true, landmarks are smoothed with a One-Euro filter before drawing
+filter_min_cutoff = 1.0 # Hz, lower values smooth slow movements more (less jitter, more lag)
+filter_beta = 0.05 # Cutoff increase per pixel/second of speed, higher values lag less on fast strokes
+filter_prediction = True # When true, the fingertip is extrapolated forward by the measured capture to display latency
+max_prediction = 0.1 # Longest extrapolation in seconds
+min_segment_length = 4 # Shortest segment in pixels stored, the line waits until the finger moved this far
+simplify_tolerance = 1.0 # Largest deviation in pixels for a new point to extend the previous segment instead of adding one
+max_merged_length = 120 # Longest segment in pixels built by extending segments
+max_stroke_jump = 400 # Longest segment in pixels drawn between two frames, longer moves start a new line
+select_dwell = 0.15 # seconds the fingertip has to stay on a color or brush button before it is selected
+brush_repeat_interval = 0.3 # seconds between brush size steps while the fingertip stays on a brush button
+max_hands = 2 # Number of hands tracked, each hand draws with its own color and brush size
+hand_track_distance = 200 # Largest palm movement in pixels between frames for a hand to keep its identity
+hand_track_timeout = 2.0 # seconds a hand that left the frame keeps its identity (and brush settings)
 
 # Define color values
 BLUE_COLOR = (255, 50, 10)   # Blue in BGR
@@ -47,6 +81,7 @@ brush_control_regions = [
 
 # Load overlays
 folder_path = "/home/cotadmin/Downloads/Interfaces"
+overlay_cache_folder = ".overlay_cache" # Resized overlays are cached here between runs (None disables the cache)
 
 overlay_paths = {
     "red":  "0_red_option.jpg",       # red overlay
@@ -55,5 +90,39 @@ overlay_paths = {
     "eraser": "3_eraser_option.jpg"  # eraser overlay
 }
 
+# Frame source: "picamera", "camera" (USB/V4L2), "video" (recorded file), "images" (image sequence) or "synthetic"
+frame_source = "picamera"
+frame_source_path = None # Camera device, video file or image directory/glob for the chosen source
+frame_source_realtime = True # When true recordings replay at native speed, otherwise as fast as possible
+
+# Threaded pipeline
+pipeline_mode = False # When true, capture, hand inference and display run as separate pipelined stages
+pipeline_queue_size = 1 # Frames buffered between stages, oldest frame is dropped when full
+first_frame_timeout = 10.0 # seconds to wait at startup for the first camera frame
+
+# Outputs of the composed canvas
+display_window = True # When false, runs headless without a window (keys are not available)
+record_video = None # Video file the composed canvas is recorded to, e.g. "recordings/canvas.mp4", None disables recording
+record_fps = 20.0 # Frame rate written to the recording
+record_codec = "mp4v" # FourCC code of the recording codec
+stream_port = None # Port of the local MJPEG stream of the canvas (http://127.0.0.1:<port>/), None disables streaming
+stream_host = "127.0.0.1" # Address the MJPEG stream listens on
+stream_quality = 80 # JPEG quality of the stream
+stream_width = 960 # Stream frames are downscaled to this width (None keeps the canvas size)
+
+# Sessions
+session_folder = "sessions" # Folder for saved sessions and PNG/SVG exports ('s' key)
+autosave_sessions = True # When true, the strokes are saved before the canvas is cleared and on exit
+max_sessions = 50 # Only the newest sessions (with their exports) are kept in session_folder, None keeps all
+
+# Metrics
+target_fps = 20 # Frame rate the HUD and metrics log flag when the loop falls below it
+metrics_window = 120 # Frames over which timings, frame rate and hand presence are averaged
+metrics_hud = False # When true, shows frame rate, stage timings and counters on screen ('m' key toggles)
+metrics_log = None # Metrics log file (.csv or .jsonl), e.g. "logs/metrics.csv", None disables logging
+metrics_interval = 5.0 # seconds between rows of the metrics log
+metrics_log_max_bytes = 1000000 # Size at which the metrics log is rotated
+metrics_log_backups = 3 # Number of rotated metrics logs kept
+
 show_countdown = True # When true shows auto-clear countdown when hand is not detected
 debug_mode = False # When true, print additional debug information
@@ -0,0 +1,136 @@
+import argparse
+import contextlib
+import json
+import sys
+import time
+import numpy as np
+import AirConfig
+from AirCanvas import AirCanvasApp, create_detector, prepare_frame
+from Frame_Source import add_source_arguments, source_from_args
+from Landmark_Trace import add_trace_arguments
+
+
+# Stages of the frame loop, in the order they run
+STAGES = ("capture", "flip_resize", "find_hands", "find_position", "fingers_up",
+          "stroke_update", "canvas_render", "compositing")
+
+
+# Collects per-stage durations for every frame
+class StageTimer:
+    def __init__(self, stages):
+        self.samples = {stage: [] for stage in stages}
+        self.frame_samples = []
+
+    # Run fn(*args), record its duration under stage and return its result
+    def time(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.samples[stage].append(time.perf_counter() - start)
+        return result
+
+    # Latency statistics in milliseconds
+    @staticmethod
+    def summarize(samples):
+        if not samples:
+            return {"count": 0}
+        ms = np.asarray(samples) * 1000.0
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        return {"count": len(ms), "mean_ms": float(ms.mean()), "p50_ms": float(p50),
+                "p95_ms": float(p95), "p99_ms": float(p99), "max_ms": float(ms.max())}
+
+    def report(self):
+        return {stage: self.summarize(samples) for stage, samples in self.samples.items()}
+
+
+# Drive the full AirCanvas frame loop headlessly (nothing is displayed) and time every stage.
+# The first warmup frames run but are not recorded.
+def run_benchmark(source, detector, app, num_frames, warmup = 10):
+    timer = StageTimer(STAGES)
+    frames = 0
+    start_time = None
+
+    while num_frames is None or frames < num_frames + warmup:
+        if frames == warmup and start_time is None:
+            # Drop the warmup samples
+            timer = StageTimer(STAGES)
+            start_time = time.perf_counter()
+
+        frame_start = time.perf_counter()
+        if detector.trace_finished:
+            break
+        frame = timer.time("capture", source.read)
+        if frame is None:
+            if source.finished:
+                break
+            continue
+
+        frame = timer.time("flip_resize", prepare_frame, frame)
+        processed_frame = timer.time("find_hands", detector.find_hands, frame)
+        landmarks = timer.time("find_position", detector.find_landmarks, processed_frame)
+        fingers = timer.time("fingers_up", detector.all_fingers_up)
+
+        current_time = time.time()
+        timer.time("stroke_update", app.update, processed_frame, landmarks, fingers, detector.handedness(), current_time)
+        img_canvas = timer.time("canvas_render", app.render_canvas, current_time)
+        timer.time("compositing", app.compose, processed_frame, img_canvas, landmarks, current_time)
+
+        timer.frame_samples.append(time.perf_counter() - frame_start)
+        frames += 1
+
+    measured = len(timer.frame_samples)
+    wall_time = time.perf_counter() - start_time if start_time is not None else 0.0
+    return {
+        "frames": measured,
+        "wall_time_s": wall_time,
+        "throughput_fps": measured / wall_time if wall_time > 0 else 0.0,
+        "frame": StageTimer.summarize(timer.frame_samples),
+        "stages": timer.report(),
+        "strokes": len(app.strokes),
+        "config": {
+            "canvas": [AirConfig.CANVAS_WIDTH, AirConfig.CANVAS_HEIGHT],
+            "inference": [AirConfig.INFERENCE_WIDTH, AirConfig.INFERENCE_HEIGHT],
+            "stroke_lifetime": AirConfig.STROKE_LIFETIME
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless AirCanvas benchmark, prints per-stage latency and FPS as JSON")
+    add_source_arguments(parser, "synthetic")
+    add_trace_arguments(parser)
+    parser.set_defaults(fast=True)
+    parser.add_argument("--realtime", dest="fast", action="store_false",
+                        help="replay recordings at their native speed (default is as fast as possible)")
+    parser.add_argument("--frames", type=int, default=300, help="number of frames to measure (0 runs until the source ends)")
+    parser.add_argument("--warmup", type=int, default=10, help="frames to run before measuring")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    num_frames = args.frames if args.frames > 0 else None
+    total_frames = None if num_frames is None else num_frames + args.warmup
+    source = source_from_args(args, (AirConfig.CANVAS_WIDTH, AirConfig.CANVAS_HEIGHT), num_frames=total_frames).start()
+
+    # Keep stdout for the JSON report, application messages go to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        detector = create_detector(args)
+        app = AirCanvasApp()
+
+        try:
+            report = run_benchmark(source, detector, app, num_frames, args.warmup)
+        finally:
+            source.stop()
+            detector.close()
+            app.close()
+
+    report["source"] = args.source
+    report["landmarks"] = args.replay_landmarks or "mediapipe"
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+import bisect
+import cv2
+import numpy as np
+from Stroke_Store import time_bucket, bucket_expired
+
+
+# Persistent drawing canvas. Instead of reallocating the canvas and redrawing every
+# stroke each frame, new segments are drawn once as they are added and only the
+# region touched by removed (expired/erased) strokes is rebuilt.
+#
+# Strokes are also drawn into one layer per time bucket (see time_bucket), cropped to the
+# area the bucket's strokes cover. When a bucket expires its layer is dropped and the area it
+# covered is recomposited from the remaining layers, without redrawing any stroke. Layers
+# near the end of their lifetime can be dimmed the same way to fade them out.
+#
+# Next to the canvas a coverage mask is kept up to date for the same regions: 255 where
+# the canvas replaces the camera image (gray value above MASK_THRESHOLD), 0 elsewhere.
+class CanvasLayer:
+    MASK_THRESHOLD = 50
+    LAYER_MARGIN = 64 # layers grow by at least this many pixels, so growing is rare
+
+    def __init__(self, width, height, header_height, bucket_seconds = 1.0):
+        self.width = width
+        self.height = height
+        self.header_height = header_height
+        self.img_canvas = np.zeros((height, width, 3), np.uint8)
+        self.coverage_mask = np.zeros((height, width), np.uint8)
+        self.bucket_seconds = bucket_seconds
+        self.layers = {}       # bucket -> [x_min, y_min, x_max, y_max, image] cropped layer
+        self.layer_order = []  # buckets with a layer, oldest first
+        self.fade = {}         # bucket -> brightness (0 to 1) of layers being faded out
+
+    # Bounding rectangle (x_min, y_min, x_max, y_max) of a stroke, padded by its thickness
+    # so that the rectangle covers every pixel cv2.line can touch. Clipped to the canvas.
+    def stroke_rect(self, stroke):
+        x_start, y_start, x_end, y_end, color, thickness = stroke[:6]
+        pad = thickness + 2
+        x_min = max(min(x_start, x_end) - pad, 0)
+        y_min = max(min(y_start, y_end) - pad, 0)
+        x_max = min(max(x_start, x_end) + pad, self.width)
+        y_max = min(max(y_start, y_end) + pad, self.height)
+        return (x_min, y_min, x_max, y_max)
+
+    # Merge two rectangles, either of which can be None
+    @staticmethod
+    def union_rect(rect_a, rect_b):
+        if rect_a is None:
+            return rect_b
+        if rect_b is None:
+            return rect_a
+        return (min(rect_a[0], rect_b[0]), min(rect_a[1], rect_b[1]),
+                max(rect_a[2], rect_b[2]), max(rect_a[3], rect_b[3]))
+
+    # Layer of a bucket, created or grown so that it covers rect
+    def layer_for(self, bucket, rect):
+        layer = self.layers.get(bucket)
+        if layer is not None and layer[0] <= rect[0] and layer[1] <= rect[1] and layer[2] >= rect[2] and layer[3] >= rect[3]:
+            return layer
+
+        margin = self.LAYER_MARGIN
+        x_min, y_min, x_max, y_max = rect if layer is None else self.union_rect(layer[:4], rect)
+        x_min, y_min = max(x_min - margin, 0), max(y_min - margin, 0)
+        x_max, y_max = min(x_max + margin, self.width), min(y_max + margin, self.height)
+        image = np.zeros((y_max - y_min, x_max - x_min, 3), np.uint8)
+        if layer is None:
+            bisect.insort(self.layer_order, bucket)
+        else:
+            old_x_min, old_y_min, old_x_max, old_y_max, old_image = layer
+            image[old_y_min - y_min:old_y_max - y_min, old_x_min - x_min:old_x_max - x_min] = old_image
+        layer = self.layers[bucket] = [x_min, y_min, x_max, y_max, image]
+        return layer
+
+    # Draw a single stroke onto the canvas and its bucket layer (or onto a region of
+    # target offset by origin). Strokes without a time stamp are only drawn on the canvas.
+    def draw_stroke(self, stroke, target=None, origin=(0, 0)):
+        x_start, y_start, x_end, y_end, color, thickness = stroke[:6]
+
+        # Only draw below header area
+        if y_start > self.header_height or y_end > self.header_height:
+            ox, oy = origin
+            if target is None:
+                rect = self.stroke_rect(stroke)
+                if len(stroke) > 6:
+                    layer = self.layer_for(time_bucket(stroke[6], self.bucket_seconds), rect)
+                    cv2.line(layer[4], (x_start - layer[0], y_start - layer[1]), (x_end - layer[0], y_end - layer[1]), color, thickness)
+                cv2.line(self.img_canvas, (x_start, y_start), (x_end, y_end), color, thickness)
+                self.update_mask(rect)
+            else:
+                cv2.line(target, (x_start - ox, y_start - oy), (x_end - ox, y_end - oy), color, thickness)
+
+    # Group strokes into runs that can be drawn as one polyline: consecutive strokes of the
+    # same path, color and thickness where each starts at the end of the previous one.
+    # Strokes that are entirely in the header are left out. Returns (points, color, thickness)
+    # runs, points being an (n, 2) int32 array.
+    def polyline_runs(self, strokes):
+        if not strokes:
+            return []
+        geometry = np.array([stroke[:4] + (stroke[5], stroke[8] if len(stroke) > 8 else -1) for stroke in strokes], dtype=np.int64)
+        colors = np.array([stroke[4] for stroke in strokes], dtype=np.int64)
+        return self.runs_from_arrays(geometry[:, 0], geometry[:, 1], geometry[:, 2], geometry[:, 3], colors, geometry[:, 4], geometry[:, 5])
+
+    # polyline_runs for strokes given as arrays (one entry per stroke, colors as (n, 3))
+    def runs_from_arrays(self, x1, y1, x2, y2, colors, thickness, path_ids):
+        # Only strokes reaching below the header are drawn
+        index = np.flatnonzero((y1 > self.header_height) | (y2 > self.header_height))
+        if len(index) == 0:
+            return []
+        x1, y1, x2, y2 = x1[index], y1[index], x2[index], y2[index]
+        colors, thickness, path_ids = colors[index], thickness[index], path_ids[index]
+
+        # A stroke continues the run of the previous one if nothing was skipped in between and
+        # it is the next segment of the same line
+        continues = ((index[1:] == index[:-1] + 1) & (path_ids[1:] >= 0) & (path_ids[1:] == path_ids[:-1]) &
+                     (colors[1:] == colors[:-1]).all(axis=1) & (thickness[1:] == thickness[:-1]) &
+                     (x1[1:] == x2[:-1]) & (y1[1:] == y2[:-1]))
+        starts = np.flatnonzero(np.concatenate([[True], ~continues]))
+        ends = np.append(starts[1:], len(index))
+
+        start_points = np.stack([x1, y1], axis=1).astype(np.int32)
+        end_points = np.stack([x2, y2], axis=1).astype(np.int32)
+        color_list = [tuple(color) for color in colors[starts].tolist()]
+        thickness_list = thickness[starts].tolist()
+        return [(np.concatenate([start_points[start:start + 1], end_points[start:end]]), color, run_thickness)
+                for start, end, color, run_thickness in zip(starts.tolist(), ends.tolist(), color_list, thickness_list)]
+
+    # Draw runs from polyline_runs onto target, offset by origin, with one call per run
+    @staticmethod
+    def draw_runs(target, runs, origin=(0, 0)):
+        offset = np.array(origin, np.int32)
+        for points, color, thickness in runs:
+            cv2.polylines(target, [points - offset], False, color, thickness)
+
+    # Draw runs straight into their bucket layers and composite the whole canvas
+    # (used to load a session onto a cleared canvas). runs_by_bucket: bucket -> runs
+    def draw_layers(self, runs_by_bucket):
+        for bucket, runs in runs_by_bucket.items():
+            if not runs:
+                continue
+            rect = None
+            for points, color, thickness in runs:
+                pad = thickness + 2
+                (x_min, y_min), (x_max, y_max) = points.min(axis=0), points.max(axis=0)
+                rect = self.union_rect(rect, (max(int(x_min) - pad, 0), max(int(y_min) - pad, 0),
+                                              min(int(x_max) + pad, self.width), min(int(y_max) + pad, self.height)))
+            layer = self.layer_for(bucket, rect)
+            self.draw_runs(layer[4], runs, origin=(layer[0], layer[1]))
+        self.recomposite((0, 0, self.width, self.height))
+
+    # Rebuild a rectangle of the canvas from the bucket layers, oldest first. Layers only hold
+    # drawn pixels over black, so each is copied where it is not black (dimmed while fading).
+    def recomposite(self, rect):
+        x_min, y_min, x_max, y_max = rect
+        if x_min >= x_max or y_min >= y_max:
+            return
+        self.img_canvas[y_min:y_max, x_min:x_max] = 0
+        for bucket in self.layer_order:
+            l_x_min, l_y_min, l_x_max, l_y_max, image = self.layers[bucket]
+            ix_min, iy_min = max(x_min, l_x_min), max(y_min, l_y_min)
+            ix_max, iy_max = min(x_max, l_x_max), min(y_max, l_y_max)
+            if ix_min >= ix_max or iy_min >= iy_max:
+                continue
+            src = image[iy_min - l_y_min:iy_max - l_y_min, ix_min - l_x_min:ix_max - l_x_min]
+            mask = np.any(src, axis=2).view(np.uint8)
+            brightness = self.fade.get(bucket, 1.0)
+            if brightness < 1.0:
+                src = cv2.convertScaleAbs(src, alpha=brightness)
+            cv2.copyTo(src, mask, self.img_canvas[iy_min:iy_max, ix_min:ix_max])
+        self.update_mask(rect)
+
+    # Drop the layers of buckets whose strokes have all expired and recomposite the area they covered
+    def expire(self, now, lifetime):
+        dirty_rect = None
+        while self.layer_order and bucket_expired(self.layer_order[0], now, lifetime, self.bucket_seconds):
+            bucket = self.layer_order.pop(0)
+            dirty_rect = self.union_rect(dirty_rect, tuple(self.layers.pop(bucket)[:4]))
+            self.fade.pop(bucket, None)
+        if dirty_rect is not None:
+            self.recomposite(dirty_rect)
+
+    # Set the brightness of a bucket layer, recompositing its area when it changes
+    def set_fade(self, bucket, brightness):
+        if bucket in self.layers and self.fade.get(bucket, 1.0) != brightness:
+            self.fade[bucket] = brightness
+            self.recomposite(tuple(self.layers[bucket][:4]))
+
+    # Recompute the coverage mask inside a rectangle of the canvas, in place
+    def update_mask(self, rect):
+        x_min, y_min, x_max, y_max = rect
+        if x_min >= x_max or y_min >= y_max:
+            return
+        mask_region = self.coverage_mask[y_min:y_max, x_min:x_max]
+        cv2.cvtColor(self.img_canvas[y_min:y_max, x_min:x_max], cv2.COLOR_BGR2GRAY, dst=mask_region)
+        cv2.threshold(mask_region, self.MASK_THRESHOLD, 255, cv2.THRESH_BINARY, dst=mask_region)
+
+    # Merge the canvas into frame in place and return it. Covered pixels take the canvas
+    # color, elsewhere the canvas is OR-ed onto the camera image (a no-op where nothing is
+    # drawn). Same result as merging through a thresholded inverse mask, without any
+    # full-frame temporaries.
+    def composite(self, frame):
+        cv2.bitwise_or(frame, self.img_canvas, dst=frame)
+        cv2.copyTo(self.img_canvas, self.coverage_mask, frame)
+        return frame
+
+    # Clear a dirty rectangle and redraw, in order, only the remaining strokes that touch it:
+    # every bucket layer overlapping the rectangle is redrawn there from its own strokes, then
+    # the canvas is recomposited. Strokes without a time stamp are drawn on the canvas only.
+    def redraw_region(self, rect, strokes):
+        if rect is None:
+            return
+
+        x_min, y_min = max(rect[0], 0), max(rect[1], 0)
+        x_max, y_max = min(rect[2], self.width), min(rect[3], self.height)
+        if x_min >= x_max or y_min >= y_max:
+            return
+        rect = (x_min, y_min, x_max, y_max)
+
+        by_bucket = {}
+        untimed = []
+        for stroke in strokes:
+            if len(stroke) > 6:
+                by_bucket.setdefault(time_bucket(stroke[6], self.bucket_seconds), []).append(stroke)
+            else:
+                untimed.append(stroke)
+
+        for bucket in set(by_bucket) | set(self.layers):
+            layer = self.layers.get(bucket)
+            if layer is None:
+                # Strokes of a bucket without a layer yet (only drawn elsewhere)
+                bucket_rect = None
+                for stroke in by_bucket[bucket]:
+                    bucket_rect = self.union_rect(bucket_rect, self.stroke_rect(stroke))
+                layer = self.layer_for(bucket, bucket_rect)
+            l_x_min, l_y_min, l_x_max, l_y_max, image = layer
+            ix_min, iy_min = max(x_min, l_x_min), max(y_min, l_y_min)
+            ix_max, iy_max = min(x_max, l_x_max), min(y_max, l_y_max)
+            if ix_min >= ix_max or iy_min >= iy_max:
+                continue
+            region = image[iy_min - l_y_min:iy_max - l_y_min, ix_min - l_x_min:ix_max - l_x_min]
+            self.rasterize(region, (ix_min, iy_min, ix_max, iy_max), by_bucket.get(bucket, []))
+
+        self.recomposite(rect)
+        if untimed:
+            region = self.img_canvas[y_min:y_max, x_min:x_max]
+            drawn = np.zeros_like(region)
+            self.rasterize(drawn, rect, untimed)
+            cv2.copyTo(drawn, np.any(drawn, axis=2).view(np.uint8), region)
+            self.update_mask(rect)
+
+    # Draw, in order, the strokes touching rect into target (the image of rect, cleared first).
+    # The strokes are drawn into a scratch buffer large enough to hold them unclipped (OpenCV
+    # rasterizes clipped thick lines slightly differently) and only rect is copied back, so
+    # anything outside it stays untouched. Continuous lines are drawn with one cv2.polylines
+    # call (same pixels as drawing their segments one by one).
+    def rasterize(self, target, rect, strokes):
+        x_min, y_min, x_max, y_max = rect
+        if not strokes:
+            target[:] = 0
+            return
+
+        # Rectangles of all strokes at once (same as stroke_rect)
+        geometry = np.array([stroke[:4] + (stroke[5],) for stroke in strokes], dtype=np.int64).reshape(-1, 5)
+        pad = geometry[:, 4] + 2
+        s_rects = np.stack([np.maximum(np.minimum(geometry[:, 0], geometry[:, 2]) - pad, 0),
+                            np.maximum(np.minimum(geometry[:, 1], geometry[:, 3]) - pad, 0),
+                            np.minimum(np.maximum(geometry[:, 0], geometry[:, 2]) + pad, self.width),
+                            np.minimum(np.maximum(geometry[:, 1], geometry[:, 3]) + pad, self.height)], axis=1)
+        overlap = ~((s_rects[:, 2] <= x_min) | (s_rects[:, 0] >= x_max) | (s_rects[:, 3] <= y_min) | (s_rects[:, 1] >= y_max))
+        touching = [strokes[i] for i in np.flatnonzero(overlap).tolist()]
+        scratch_rect = rect
+        if len(touching):
+            s_rects = s_rects[overlap]
+            scratch_rect = self.union_rect(rect, (int(s_rects[:, 0].min()), int(s_rects[:, 1].min()),
+                                                  int(s_rects[:, 2].max()), int(s_rects[:, 3].max())))
+
+        sx_min, sy_min, sx_max, sy_max = scratch_rect
+        scratch = np.zeros((sy_max - sy_min, sx_max - sx_min, 3), np.uint8)
+        self.draw_runs(scratch, self.polyline_runs(touching), origin=(sx_min, sy_min))
+
+        target[:] = scratch[y_min - sy_min:y_max - sy_min, x_min - sx_min:x_max - sx_min]
+
+    def clear(self):
+        self.img_canvas[:] = 0
+        self.coverage_mask[:] = 0
+        self.layers = {}
+        self.layer_order = []
+        self.fade = {}
@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+
+
+# What HandDetectorMP does with a frame
+FULL = "full"     # run hand inference at the inference size
+PROBE = "probe"   # run hand inference on a smaller frame, looking for a hand to appear
+REUSE = "reuse"   # no inference, reuse (extrapolate) the last landmarks
+SKIP = "skip"     # no inference, no hands
+MODES = (FULL, PROBE, REUSE, SKIP)
+
+
+# Decides per frame how much hand detection work is needed:
+# - while no hand has been seen for idle_delay seconds, only probe for hands idle_rate times
+#   per second on a downscaled frame
+# - while a hand is present but not drawing, and the image around it has barely changed since
+#   the last inference (mean gray level difference below motion_threshold), reuse the last
+#   landmarks, extrapolated with their last velocity, for up to max_reuse frames in a row
+# - while drawing, run full inference every frame
+class DetectionScheduler:
+    def __init__(self, idle_rate = 5.0, probe_size = (320, 180), motion_threshold = 3.0, max_reuse = 5,
+                 idle_delay = 1.0, thumb_size = (160, 90)):
+        self.idle_interval = 1.0 / idle_rate if idle_rate > 0 else 0.0
+        self.probe_size = probe_size
+        self.motion_threshold = motion_threshold
+        self.max_reuse = max_reuse
+        self.idle_delay = idle_delay
+        self.thumb_size = thumb_size # size of the grayscale thumbnails compared for motion
+
+        self.reference = None # thumbnail of the frame the last landmarks were detected on
+        self.last_inference = None
+        self.last_hand_time = None
+        self.reused = 0
+        self.points = np.zeros((0, 21, 2), np.float32)
+        self.velocity = None # landmark movement per frame between the last two inferences
+        self.thumb = None # thumbnail of the current frame, if plan() made one
+
+    def thumbnail(self, img):
+        small = cv2.resize(img, self.thumb_size, interpolation = cv2.INTER_LINEAR)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    # Mean absolute gray level change inside the (padded) bounding box of the last landmarks
+    def motion(self, thumb):
+        w, h = self.thumb_size
+        x_min, y_min = np.nanmin(self.points.reshape(-1, 2), axis=0)
+        x_max, y_max = np.nanmax(self.points.reshape(-1, 2), axis=0)
+        pad_x, pad_y = (x_max - x_min) * 0.5, (y_max - y_min) * 0.5
+        x1, x2 = int(np.clip((x_min - pad_x) * w, 0, w)), int(np.clip(np.ceil((x_max + pad_x) * w), 0, w))
+        y1, y2 = int(np.clip((y_min - pad_y) * h, 0, h)), int(np.clip(np.ceil((y_max + pad_y) * h), 0, h))
+        if x2 <= x1 or y2 <= y1:
+            return np.inf
+        return float(cv2.absdiff(thumb[y1:y2, x1:x2], self.reference[y1:y2, x1:x2]).mean())
+
+    # Decide what to do with img. drawing tells whether any hand is currently drawing.
+    def plan(self, img, drawing, now):
+        self.thumb = None
+        if not len(self.points):
+            idle = self.last_hand_time is None or now - self.last_hand_time >= self.idle_delay
+            if not idle:
+                return FULL
+            if self.last_inference is None or now - self.last_inference >= self.idle_interval:
+                return PROBE
+            return SKIP
+
+        if drawing or self.reused >= self.max_reuse or self.reference is None:
+            return FULL
+        self.thumb = self.thumbnail(img)
+        if self.motion(self.thumb) >= self.motion_threshold:
+            return FULL
+        self.reused += 1
+        return REUSE
+
+    # Landmarks to use for a frame without inference
+    def predict(self):
+        if self.velocity is None:
+            return self.points
+        return np.clip(self.points + self.velocity * self.reused, 0.0, 1.0)
+
+    # Record the result of an inference on img
+    def observe(self, img, points, now):
+        frames = self.reused + 1
+        if len(points) and len(points) == len(self.points):
+            self.velocity = (points - self.points) / frames
+        else:
+            self.velocity = None
+        self.points = points
+        self.reused = 0
+        self.last_inference = now
+        if len(points):
+            self.last_hand_time = now
+            self.reference = self.thumb if self.thumb is not None else self.thumbnail(img)
+        else:
+            self.reference = None
@@ -0,0 +1,235 @@
+import glob
+import os
+import time
+import cv2
+import numpy as np
+import AirConfig
+
+
+# Frame sources. Every source returns BGR frames from read() and None when no frame is
+# available; finished becomes True once a finite source (file, image sequence, fixed
+# length generator) has no more frames.
+class FrameSource:
+    finished = False
+
+    def start(self):
+        return self
+
+    def read(self):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+
+# Raspberry Pi camera through Picamera2. picamera2 is only imported when the camera is
+# started so the rest of the application can run on machines without it.
+class PicameraSource(FrameSource):
+    def __init__(self, size):
+        self.size = size
+        self.picam2 = None
+
+    def start(self):
+        from picamera2 import Picamera2
+
+        self.picam2 = Picamera2()
+        video_config = self.picam2.create_preview_configuration(main={"size": self.size, "format": "RGB888"})
+        self.picam2.configure(video_config)
+        self.picam2.start()
+        return self
+
+    def read(self):
+        return self.picam2.capture_array()
+
+    def stop(self):
+        if self.picam2 is not None:
+            self.picam2.stop()
+
+
+# USB/V4L2 camera (or anything else cv2.VideoCapture can open live)
+class VideoCaptureSource(FrameSource):
+    def __init__(self, device = 0, size = None):
+        self.device = device
+        self.size = size
+        self.cap = None
+
+    def start(self):
+        self.cap = cv2.VideoCapture(self.device)
+        if self.size is not None:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.size[0])
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.size[1])
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Could not open video device {self.device}")
+        return self
+
+    def read(self):
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def stop(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+# Paces playback of recorded frames. In realtime mode read() waits until the frame is due
+# at the recording's frame rate, otherwise frames are returned as fast as they are read.
+class _Pacer:
+    def __init__(self, fps, realtime):
+        self.interval = 1.0 / fps if fps and fps > 0 else 0.0
+        self.realtime = realtime
+        self.next_time = None
+
+    def wait(self):
+        if not self.realtime or self.interval == 0.0:
+            return
+        now = time.perf_counter()
+        if self.next_time is None:
+            self.next_time = now
+        elif self.next_time > now:
+            time.sleep(self.next_time - now)
+        self.next_time = max(self.next_time, now - self.interval) + self.interval
+
+
+# Recorded video file
+class VideoFileSource(FrameSource):
+    def __init__(self, path, realtime = True, loop = False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.cap = None
+        self.pacer = None
+        self.finished = False
+
+    def start(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Video file not found: {self.path}")
+        self.cap = cv2.VideoCapture(self.path)
+        self.pacer = _Pacer(self.cap.get(cv2.CAP_PROP_FPS), self.realtime)
+        return self
+
+    def read(self):
+        if self.finished:
+            return None
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        if not ret:
+            self.finished = True
+            return None
+        self.pacer.wait()
+        return frame
+
+    def stop(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+# Sequence of image files, given as a directory or a glob pattern (played in name order)
+class ImageSequenceSource(FrameSource):
+    def __init__(self, path, fps = 30.0, realtime = True, loop = False):
+        if os.path.isdir(path):
+            path = os.path.join(path, "*")
+        self.files = sorted(f for f in glob.glob(path) if os.path.splitext(f)[1].lower() in (".png", ".jpg", ".jpeg", ".bmp"))
+        self.pacer = _Pacer(fps, realtime)
+        self.loop = loop
+        self.position = 0
+        self.finished = False
+
+    def start(self):
+        if not self.files:
+            raise FileNotFoundError("No images found for image sequence source")
+        return self
+
+    def read(self):
+        if self.position >= len(self.files):
+            if not self.loop:
+                self.finished = True
+                return None
+            self.position = 0
+        frame = cv2.imread(self.files[self.position])
+        self.position += 1
+        self.pacer.wait()
+        return frame
+
+
+# Generated frames: a textured background with a moving bright disc. Useful to exercise
+# and time the pipeline without any camera or recording.
+class SyntheticSource(FrameSource):
+    def __init__(self, size = None, fps = 30.0, realtime = True, num_frames = None):
+        self.size = size or (640, 480)
+        self.pacer = _Pacer(fps, realtime)
+        self.num_frames = num_frames # None generates frames forever
+        self.count = 0
+        self.finished = False
+
+        width, height = self.size
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)
+        self.background = np.dstack([np.add.outer(y, x) / 2, np.tile(x, (height, 1)), np.tile(y[:, None], (1, width))]).astype(np.uint8)
+
+    def read(self):
+        if self.num_frames is not None and self.count >= self.num_frames:
+            self.finished = True
+            return None
+
+        width, height = self.size
+        angle = self.count / 30.0
+        center = (int(width * (0.5 + 0.3 * np.cos(angle))), int(height * (0.55 + 0.3 * np.sin(angle))))
+        frame = self.background.copy()
+        cv2.circle(frame, center, max(height // 12, 1), (180, 200, 230), cv2.FILLED)
+
+        self.count += 1
+        self.pacer.wait()
+        return frame
+
+
+# First frame of a started source, waiting up to timeout seconds for it. None if the source
+# finished or no frame arrived in time.
+def wait_for_frame(source, timeout = 10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        frame = source.read()
+        if frame is not None:
+            return frame
+        if source.finished or time.monotonic() > deadline:
+            return None
+        time.sleep(0.005)
+
+
+SOURCE_KINDS = ("picamera", "camera", "video", "images", "synthetic")
+
+# Create a frame source by kind.
+# kind: one of SOURCE_KINDS
+# path: camera device index/path for "camera", file for "video", directory/glob for "images"
+# realtime: replay recordings at their native speed (True) or as fast as possible (False)
+def open_source(kind, size, path = None, realtime = True, loop = False, num_frames = None):
+    if kind == "picamera":
+        return PicameraSource(size)
+    elif kind == "camera":
+        device = 0 if path is None else (int(path) if str(path).isdigit() else path)
+        return VideoCaptureSource(device, size)
+    elif kind in ("video", "images") and path is None:
+        raise ValueError(f"--input is required for the '{kind}' source ({'a video file' if kind == 'video' else 'an image folder or glob pattern'})")
+    elif kind == "video":
+        return VideoFileSource(path, realtime, loop)
+    elif kind == "images":
+        return ImageSequenceSource(path, realtime=realtime, loop=loop)
+    elif kind == "synthetic":
+        return SyntheticSource(size, realtime=realtime, num_frames=num_frames)
+    raise ValueError(f"Unknown frame source '{kind}', expected one of {', '.join(SOURCE_KINDS)}")
+
+
+# Command line options shared by every entry point that reads frames
+def add_source_arguments(parser, default_kind):
+    parser.add_argument("--source", choices=SOURCE_KINDS, default=default_kind,
+                        help="where frames come from")
+    parser.add_argument("--input", default=AirConfig.frame_source_path,
+                        help="camera device, video file or image directory/glob for the chosen source")
+    parser.add_argument("--fast", action="store_true", default=not AirConfig.frame_source_realtime,
+                        help="replay recordings as fast as possible instead of at their native speed")
+    parser.add_argument("--loop", action="store_true", help="restart recordings when they end")
+
+
+def source_from_args(args, size, num_frames = None):
+    return open_source(args.source, size, args.input, realtime=not args.fast, loop=args.loop, num_frames=num_frames)
@@ -0,0 +1,105 @@
+import numpy as np
+
+
+# Hand gestures are defined on the fingers up of a hand (thumb to pinky, 1 = up, see
+# HandDetectorMP.fingers_up). A gesture is either a pattern with 1 (up), 0 (down) or None (any)
+# per finger, or a function taking the five fingers and returning True when it matches.
+class Gesture:
+    def __init__(self, name, match):
+        self.name = name
+        self.match = match
+
+    def matches(self, fingers):
+        if callable(self.match):
+            return bool(self.match(fingers))
+        return all(want is None or want == up for want, up in zip(self.match, fingers))
+
+
+# Default gestures: index and middle finger up selects (lifts the pen), only the index finger draws
+DEFAULT_GESTURES = [
+    Gesture("select", (None, 1, 1, None, None)),
+    Gesture("draw", (None, 1, 0, None, None)),
+]
+
+
+# Classifies fingers up into gestures, first matching gesture wins. With only 32 possible finger
+# combinations, every combination is classified up front and a lookup is a single table read.
+class GestureSet:
+    def __init__(self, gestures = None):
+        self.gestures = list(DEFAULT_GESTURES if gestures is None else gestures)
+        self.build()
+
+    def build(self):
+        self.table = []
+        for bits in range(32):
+            fingers = [(bits >> finger) & 1 for finger in range(5)]
+            self.table.append(next((gesture.name for gesture in self.gestures if gesture.matches(fingers)), None))
+
+    # Add a gesture, ahead of the existing ones when first is True
+    def add(self, gesture, first = False):
+        if first:
+            self.gestures.insert(0, gesture)
+        else:
+            self.gestures.append(gesture)
+        self.build()
+
+    # Name of the gesture made with fingers, None if no gesture matches
+    def classify(self, fingers):
+        f0, f1, f2, f3, f4 = fingers
+        return self.table[(f0 != 0) | (f1 != 0) << 1 | (f2 != 0) << 2 | (f3 != 0) << 3 | (f4 != 0) << 4]
+
+
+# Label map of the interactive screen regions: one uint8 label per pixel, so finding the region
+# under the fingertip is a single array read however many regions there are. Label 0 is no region,
+# label i refers to actions[i]. Regions added later win where regions overlap.
+class HitMap:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.labels = np.zeros((height, width), np.uint8)
+        self.actions = [None]
+
+    # Mark the rectangle x_min <= x <= x_max, y_min <= y <= y_max (fractional bounds allowed) with action
+    def add(self, x_min, x_max, y_min, y_max, action):
+        if len(self.actions) > 255:
+            raise ValueError("HitMap supports at most 255 regions")
+        x1, y1 = max(int(np.ceil(x_min)), 0), max(int(np.ceil(y_min)), 0)
+        x2, y2 = min(int(np.floor(x_max)) + 1, self.width), min(int(np.floor(y_max)) + 1, self.height)
+        self.labels[y1:y2, x1:x2] = len(self.actions)
+        self.actions.append(action)
+
+    # Action of the region under (x, y), None outside every region
+    def lookup(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.actions[self.labels[y, x]]
+        return None
+
+
+# Dwell/debounce state machine for one pointer. A target (e.g. the action of the region under
+# the fingertip) fires once the pointer stayed on it for dwell seconds, and again every repeat
+# seconds while it stays there (when a repeat interval is given). Moving off the target resets it.
+# Purely time based, so it never blocks the frame loop.
+class DwellTracker:
+    def __init__(self, dwell = 0.15):
+        self.dwell = dwell
+        self.target = None
+        self.since = None # when the pointer arrived on the target
+        self.fired = None # when the target last fired
+
+    # Returns target when it fires at time now, otherwise None
+    def update(self, target, now, repeat = None):
+        if target != self.target:
+            self.target, self.since, self.fired = target, now, None
+        if target is None:
+            return None
+        if self.fired is None:
+            if now - self.since >= self.dwell:
+                self.fired = now
+                return target
+        elif repeat is not None and now - self.fired >= repeat:
+            self.fired = now
+            return target
+        return None
+
+    def reset(self):
+        self.target = self.since = self.fired = None
@@ -1,131 +1,338 @@
 import cv2 # import open cv
-import mediapipe as mp # import mediapipe
-from google.protobuf.json_format import MessageToDict # library to convert protocol buffers message to a dictionary
+import numpy as np
 import time
+from Landmark_Trace import TracePlayer, TraceRecorder
+from Detection_Scheduler import FULL, PROBE, REUSE, SKIP
+
+# Landmark ids used by the finger logic
+TIP_IDS = np.array([4, 8, 12, 16, 20]) # finger tips, thumb tip to pinky tip respectively
+THUMB_TIP, THUMB_IP = 4, 3
+
+
+# Normalized landmark points (hands, 21, 2) of a MediaPipe (or replayed) result, in one conversion
+def landmark_points(results):
+	if results is None:
+		return np.zeros((0, 21, 2), np.float32)
+	points = getattr(results, "landmark_array", None)
+	if points is not None:
+		return points
+	if not results.multi_hand_landmarks:
+		return np.zeros((0, 21, 2), np.float32)
+	return np.array([[(lm.x, lm.y) for lm in hand_lms.landmark] for hand_lms in results.multi_hand_landmarks], dtype=np.float32)
+
+
+# Fingers up for every hand of a (hands, 21, 3) [id, x, y] landmark array, as a (hands, 5) array of 0/1.
+# Thumb is up when its tip is right of its IP joint, other fingers when the tip is above the joint two ids below.
+def fingers_up_array(landmarks):
+	fingers = np.zeros((len(landmarks), 5), np.int32)
+	if len(landmarks):
+		fingers[:, 0] = landmarks[:, THUMB_TIP, 1] > landmarks[:, THUMB_IP, 1]
+		fingers[:, 1:] = landmarks[:, TIP_IDS[1:], 2] < landmarks[:, TIP_IDS[1:] - 2, 2]
+	return fingers
+
 
 class HandDetectorMP:
-	def __init__(self, mode = False, max_hands = 2, model_complexity = 1, detection_con = 0.5, track_con = 5.0):
+	# trace_path replays a recorded/generated landmark trace instead of running MediaPipe (see Landmark_Trace.py)
+	# record_path records the landmarks of every processed frame to a trace file
+	# scheduler (a DetectionScheduler) skips or downscales inference when little is happening, None runs it every frame
+	# roi_size enables inference on a square crop around the last detected hands, resized to roi_size pixels
+	# (None always uses the whole frame). The whole frame is used again when a hand is lost and every
+	# roi_full_interval frames, so new hands are found.
+	# use_worker runs MediaPipe in a separate process (see Inference_Worker.py): frames of up to
+	# worker_frame_size (width, height) go through worker_slots shared memory buffers, and
+	# find_hands returns the newest finished result instead of waiting for the current frame.
+	def __init__(self, mode = False, max_hands = 2, model_complexity = 1, detection_con = 0.5, track_con = 5.0, inference_size = None,
+				 trace_path = None, record_path = None, loop_trace = False, scheduler = None,
+				 roi_size = None, roi_padding = 0.6, roi_full_interval = 15,
+				 use_worker = False, worker_slots = 2, worker_frame_size = (1920, 1080)):
 		self.mode = mode # toggles between static and tracking modes 
 		self.max_hands = max_hands # determiens maximum number of hands to detect and track
 		self.model_complexity = model_complexity # parameter influencing accuracy and speed of tracking (computational load)
 		self.detection_con = detection_con # Confidence thresholds for initating hand detection 
 		self.track_con = track_con  # Confidence thresholds for initating maintaining tracking
+		self.inference_size = inference_size # (width, height) frames are downscaled to before inference, None keeps full resolution
 		
-		self.tip_ids = [4, 8, 12, 16, 20] # isolating finger tips, thumb tip to pinky tip respectively
-		self.mp_hands = mp.solutions.hands 
-		self.hands = self.mp_hands.Hands(self.mode, self.max_hands, self.model_complexity, self.detection_con, self.track_con) # MediaPipe's hand module
-		self.mp_draw = mp.solutions.drawing_utils 
+		self.tip_ids = list(TIP_IDS) # isolating finger tips, thumb tip to pinky tip respectively
+		self.results = None
+		self.points = np.zeros((0, 21, 2), np.float32) # normalized landmarks of every detected hand
+		self.landmarks = np.zeros((0, 21, 3), np.int32) # [id, x, y] pixel landmarks of every detected hand
+		self.hand_no = 0
+		self.lm_list = []
+		self.scheduler = scheduler
+		self.last_mode = FULL # what the scheduler decided for the last frame
+		self.roi_size = roi_size
+		self.roi_padding = roi_padding # padding around the hands, as a fraction of their size on every side
+		self.roi_full_interval = roi_full_interval
+		self.roi_frames = 0 # frames inferred on a crop since the last whole frame inference
+		self.roi = None # (x1, y1, x2, y2) crop self.results were inferred on, None for the whole frame
+		self.points_time = time.time() # when the frame self.points were detected on arrived
+		self.worker = None
+		
+		self.trace = TracePlayer(trace_path, loop_trace) if trace_path else None # replayed landmarks bypass the model
+		self.recorder = TraceRecorder(record_path, self.max_hands) if record_path else None
+		
+		if self.trace is None and use_worker:
+			from Inference_Worker import InferenceWorker
+			width, height = worker_frame_size
+			self.worker = InferenceWorker((height, width, 3), (self.mode, self.max_hands, self.model_complexity, self.detection_con, self.track_con), worker_slots,
+										  crops=roi_size is not None)
+		elif self.trace is None:
+			import mediapipe as mp # import mediapipe (only needed for live detection)
+			self.mp_hands = mp.solutions.hands 
+			self.hands = self.mp_hands.Hands(self.mode, self.max_hands, self.model_complexity, self.detection_con, self.track_con) # MediaPipe's hand module
+			# Crops are inferred by a second instance: in tracking mode MediaPipe starts each frame from the
+			# last landmarks, in the coordinates of the image it was given, so one instance switching between
+			# crops and whole frames would start from the wrong place after every switch (and miss the hand)
+			self.roi_hands = self.mp_hands.Hands(self.mode, self.max_hands, self.model_complexity, self.detection_con, self.track_con) if roi_size is not None else None
+			self.mp_draw = mp.solutions.drawing_utils 
 			
 	# Process input image for hand detection and landmark extraction 	
+	# Landmarks are normalized (0 to 1), so inference can run on a downscaled copy while
+	# find_position still returns pixel positions in the resolution of img
 	def find_hands(self, img, draw = True): 
-		img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB) 
-		self.results = self.hands.process(img_rgb) # Stores self.hands attributes 
+		frame_time = time.time()
+		if self.trace is not None:
+			# Replay the next traced frame instead of running the model
+			self.results = self.trace.next_results()
+			self.points = landmark_points(self.results)
+			self.points_time = frame_time
+			if self.recorder is not None:
+				self.recorder.record(self.points)
+			if draw:
+				self.draw_points(img)
+			return img
+		
+		inference_size = self.inference_size
+		if self.scheduler is not None:
+			now = time.perf_counter()
+			fingers = self.all_fingers_up() # of the previous frame
+			drawing = bool(np.any(fingers[:, 1] & (1 - fingers[:, 2]))) # index finger up, middle finger down
+			self.last_mode = self.scheduler.plan(img, drawing, now)
+			if self.last_mode == PROBE:
+				inference_size = self.scheduler.probe_size
 		
-		if self.results.multi_hand_landmarks: # checks if multiple hand land marks are present in processed image
+		if self.last_mode == SKIP:
+			self.results = None
+			self.points = np.zeros((0, 21, 2), np.float32)
+			self.points_time = frame_time
+		elif self.last_mode == REUSE:
+			self.points = self.scheduler.predict()
+			self.points_time = frame_time
+		elif self.worker is not None:
+			self.submit_to_worker(img, inference_size, frame_time)
+		else:
+			roi = self.hand_roi(img) if self.last_mode == FULL else None
+			if roi is not None:
+				# Infer on the crop around the hands and map the landmarks back to the whole frame
+				x1, y1, x2, y2 = roi
+				self.results = self.infer(img[y1:y2, x1:x2], (self.roi_size, self.roi_size), self.roi_hands)
+				points = landmark_points(self.results)
+				if len(points) < len(self.points):
+					roi = None # hand lost, look at the whole frame
+				else:
+					h, w = img.shape[:2]
+					self.points = ((points * np.array([x2 - x1, y2 - y1], np.float32) + (x1, y1)) / (w, h)).astype(np.float32)
+					self.roi_frames += 1
+			if roi is None:
+				self.results = self.infer(img, inference_size)
+				self.points = landmark_points(self.results)
+				self.roi_frames = 0
+			self.roi = roi
+			self.points_time = frame_time
+			if self.scheduler is not None:
+				self.scheduler.observe(img, self.points, now)
+		if self.worker is not None:
+			# Keep the last result until the worker finishes a newer frame
+			self.collect_from_worker(img, now if self.scheduler is not None else None)
+		if self.recorder is not None:
+			self.recorder.record(self.points)
+		
+		if draw and (self.roi is not None or self.worker is not None):
+			# Results of a crop are not in whole frame coordinates (worker results are not MediaPipe objects)
+			self.draw_points(img)
+		elif self.results is not None and self.results.multi_hand_landmarks: # checks if multiple hand land marks are present in processed image
 			for hand_lms in self.results.multi_hand_landmarks: 
 				if draw: # parameter
 					self.mp_draw.draw_landmarks(img, hand_lms, self.mp_hands.HAND_CONNECTIONS)  # method for drawing utilities from media pipe to overlay lindmarks/connections on image
 		return img # returns processed image with drawn hand landmarks
+	
+	# Run the model (hands, self.hands unless given) on img, downscaled to size (width, height) first unless size is None
+	def infer(self, img, size, hands = None):
+		img_small = img
+		if size is not None and (img.shape[1], img.shape[0]) != tuple(size):
+			img_small = cv2.resize(img, tuple(size), interpolation = cv2.INTER_AREA)
+		img_rgb = cv2.cvtColor(img_small, cv2.COLOR_BGR2RGB) 
+		return (self.hands if hands is None else hands).process(img_rgb) # Stores self.hands attributes 
+	
+	# Hand img to the inference worker, unless it is still busy with earlier frames (the frame is then
+	# dropped, the worker always gets the newest frame once it is free). Same crop choice as inline inference.
+	def submit_to_worker(self, img, inference_size, frame_time):
+		if self.worker.busy:
+			return
+		roi = self.hand_roi(img) if self.last_mode == FULL else None
+		size = (self.roi_size, self.roi_size) if roi is not None else inference_size
+		self.worker.submit(img, roi, size, (roi, img.shape[:2], len(self.points), frame_time))
+		self.roi_frames = self.roi_frames + 1 if roi is not None else 0
+	
+	# Take the newest finished worker result, if any, mapping crop landmarks back to the whole frame
+	def collect_from_worker(self, img, now):
+		finished = self.worker.poll()
+		if finished is None:
+			return
+		results, info = finished
+		if info is None:
+			return # late warmup result
+		self.results = results
+		roi, (h, w), expected_hands, frame_time = info
+		points = landmark_points(self.results)
+		if roi is not None:
+			x1, y1, x2, y2 = roi
+			points = ((points * np.array([x2 - x1, y2 - y1], np.float32) + (x1, y1)) / (w, h)).astype(np.float32)
+			if len(points) < expected_hands:
+				self.roi_frames = self.roi_full_interval # hand lost, look at the whole frame next
+		self.points = points
+		self.roi = roi
+		self.points_time = frame_time
+		if now is not None:
+			self.scheduler.observe(img, self.points, now)
+	
+	# Run the model once on img so its first real frame is not slowed down by initialization
+	# (and the crop model once on a crop of img). The results are discarded.
+	def warmup(self, img, timeout = 30.0):
+		if self.trace is not None:
+			return
+		side = min(self.roi_size, *img.shape[:2]) if self.roi_size is not None else None
+		if self.worker is not None:
+			if self.worker.submit(img, None, self.inference_size):
+				self.worker.poll(timeout)
+			if side is not None and self.worker.submit(img, (0, 0, side, side), (self.roi_size, self.roi_size)):
+				self.worker.poll(timeout)
+		else:
+			self.infer(img, self.inference_size)
+			if side is not None:
+				self.infer(img[:side, :side], (self.roi_size, self.roi_size), self.roi_hands)
+	
+	# Square pixel crop (x1, y1, x2, y2) around the last detected hands, padded by roi_padding.
+	# None when the whole frame should be used: no hand, ROI disabled, a periodic whole frame
+	# inference is due, or the crop would cover most of the frame anyway.
+	def hand_roi(self, img):
+		if self.roi_size is None or not len(self.points) or self.roi_frames >= self.roi_full_interval:
+			return None
+		h, w = img.shape[:2]
+		pixels = self.points.reshape(-1, 2) * (w, h)
+		(x_min, y_min), (x_max, y_max) = pixels.min(axis=0), pixels.max(axis=0)
+		side = int(max(x_max - x_min, y_max - y_min) * (1 + 2 * self.roi_padding))
+		side = max(side, self.roi_size)
+		if side * side > w * h // 2 or side > min(w, h):
+			return None
+		x1 = int(np.clip((x_min + x_max - side) / 2, 0, w - side))
+		y1 = int(np.clip((y_min + y_max - side) / 2, 0, h - side))
+		return x1, y1, x1 + side, y1 + side
+	
+	# Mark every landmark of self.points on img
+	def draw_points(self, img):
+		if len(self.points):
+			h, w = img.shape[:2]
+			for x, y in (self.points.reshape(-1, 2) * (w, h)).astype(np.int32).tolist():
+				cv2.circle(img, (x, y), 4, (0, 0, 255), cv2.FILLED)
+	
+	# True once a non-looping landmark trace has been fully replayed
+	@property
+	def trace_finished(self):
+		return self.trace is not None and self.trace.finished
+	
+	# Flush the landmark recording (if any) to disk and stop the inference worker
+	def close(self):
+		if self.worker is not None:
+			self.worker.close()
+			self.worker = None
+		if self.recorder is not None:
+			self.recorder.close()
+			self.recorder = None
+	
+	# Pixel landmarks of every detected hand as a (hands, 21, 3) array of [id, x, y], converting
+	# the normalized coordinates of all hands in one vectorized step (truncated like int()).
+	def find_landmarks(self, img):
+		h, w = img.shape[:2]
+		hands = len(self.points)
+		self.landmarks = np.empty((hands, 21, 3), np.int32)
+		self.landmarks[:, :, 0] = np.arange(21)
+		self.landmarks[:, :, 1:] = self.points * np.array([w, h], np.float32)
+		return self.landmarks
 		
 	# Taking image as primary input, along with optional parameters for specifying hand index (hand_no) and boolean flag (draw)
 	# indicating whether detected landmarks should be visually highlighted on image.  	
+	# The list of [id, cx, cy] for the selected hand is a view of the array from find_landmarks.
 	def find_position(self, img, hand_no = 0, draw = True): # hand_no allows the user to choose which hand's landmarkers to track
+		self.find_landmarks(img)
+		self.hand_no = hand_no
 		self.lm_list = [] # Empty list to store info about detected landmarks
 		
-		if self.results.multi_hand_landmarks: # multi hand landmarks check
-			selected_hand = self.results.multi_hand_landmarks[hand_no]
-			for l_id, lm in enumerate(selected_hand.landmark):
-				h, w, c = img.shape
-				
-				# iterates through each landmark in selected hand to calculate pixel coordinates using cx and cy
-				# the landmarks normalized coordinates represented by lm.x and lm.y, ranging between 0 and 1, will represent the position of the landmark within the image   
-				cx, cy = int(lm.x * w), int(lm.y * h) 
-				self.lm_list.append([l_id, cx, cy]) 
-				
-				if draw:
+		if hand_no < len(self.landmarks):
+			self.lm_list = self.landmarks[hand_no].tolist()
+			if draw:
+				for l_id, cx, cy in self.lm_list:
 					cv2.circle(img, (cx, cy), 10, (200, 100, 200), cv2.FILLED) 
 					
 		return self.lm_list
 		
-		
-		
-	# Method processes an input image with optional perameters, 
-	# hand index (hand_no) to specify which hand's landmarks to track 
-	# and a boolean flag (draw to determine whether to visually annotate 
-	# the detected landmarks. It begins by initializing an empty list 
-	# (self.lm_list) to store landmark data and then verifies the 
-	# presence of multi-hand landmarks. For selected hand, the method 
-	# iterates through each landmark, converting normalized coordinates 
-	# into absolute pixel values by multiplying with image's width and 
-	# height and rounding these values to nearest int. Computed data, 
-	# including landmark IDs and their coresponding pixel position, is 
-	# added to self.lm_list. Additionally, if draw is set to True, method 
-	# utilizes OpenCV (cv2.circle) to overlay visual markers on the image,
-	# thereby offering a customizable visualization of hand landmarks 
+	# Fingers up (thumb to pinky, 1 = up) for the hand selected in find_position,
+	# as a list for the existing callers. See fingers_up_array for all hands at once.
 	def fingers_up(self):
-		fingers = []
-		
 		if not self.lm_list:
 			return[0, 0, 0, 0, 0]
-		
-	# Thumb logic using temp variables 
-		thumb_tip = self.lm_list[self.tip_ids[0]]
-		thumb_ip = self.lm_list[self.tip_ids[0]-1]
-		if thumb_tip[1] > thumb_ip[1]:
-			fingers.append(1)
-		else:
-			fingers.append(0)			
-
-				
-	# Fingers logic
-		for id in range(1, 5):
-			if self.lm_list[self.tip_ids[id]][2] < self.lm_list[self.tip_ids[id] - 2][2]:
-				fingers.append(1)
-			else:
-				fingers.append(0)
-			
-		return fingers
-		
-    # Initialize variables, capture video from webcam, and continuously process frames.
-    # Loop utilizes instance of HandDetectorMP class, detects hands and 
-    # retrieves landmark positions. Prints coordinates of specific landmark (5th landmark)
-    # then calculates and displays frames per second of video feed.
-	if __name__ == "__main__":
-		p_time = 0 
-		cap = cv2.VideoCapture(0)
-		detector = HandDetectorMP(detection_con=0.8, track_con=0.5) # Variable for whole HandDetectorMP class
-		
-		while True:
-			ret, img = cap.read()
-			if not ret:
-				break
-			img = detector.find_hand(img)
-			lm_list = detector.find_position(img, draw = True)
-			
-			if lm_list:
-				fingers = detector.find_hands()
-				cv2.putText(img, f"Fingers: {fingers}", (10, 70),
-				cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
-				print(lm_list[4])
-			c_time = time.time()
-			fps = 1 / (c_time - p_time) if (c_time - p_time) != 0 else 0
-			p_time = c_time
-			
-			cv2.putText(img, f"FPS: {int(fps)}", (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
-			cv2.imshow("Hand Detection", img)
-			if cv2.waitKey(1) & 0xFF == ord('q'):
-				break
-			
-			cap.release()
-			cv2.destroyAllWindows()
-		
-		
-		
-		
+		return fingers_up_array(self.landmarks[self.hand_no:self.hand_no + 1])[0].tolist()
 	
+	# Fingers up for every detected hand, (hands, 5)
+	def all_fingers_up(self):
+		return fingers_up_array(self.landmarks)
+	
+	# "Left"/"Right" label of every detected hand, or None when the detector does not report it
+	def handedness(self):
+		if getattr(self.results, "labels", None) is not None:
+			return self.results.labels
+		if self.results is None or not getattr(self.results, "multi_handedness", None):
+			return None
+		return [hand.classification[0].label for hand in self.results.multi_handedness]
 		
-
-		
+# Initialize variables, capture video (webcam by default, see --source), and continuously process frames.
+# Loop utilizes instance of HandDetectorMP class, detects hands and 
+# retrieves landmark positions. Prints coordinates of specific landmark (5th landmark)
+# then calculates and displays frames per second of video feed.
+if __name__ == "__main__":
+	import argparse
+	from Frame_Source import add_source_arguments, source_from_args
+	
+	parser = argparse.ArgumentParser(description="Hand detection preview")
+	add_source_arguments(parser, "camera")
+	args = parser.parse_args()
+	
+	p_time = 0 
+	source = source_from_args(args, None).start()
+	detector = HandDetectorMP(detection_con=0.8, track_con=0.5) # Variable for whole HandDetectorMP class
+	
+	while True:
+		img = source.read()
+		if img is None:
+			if source.finished:
+				break
+			continue
+		img = detector.find_hands(img)
+		lm_list = detector.find_position(img, draw = True)
 		
+		if lm_list:
+			fingers = detector.fingers_up()
+			cv2.putText(img, f"Fingers: {fingers}", (10, 70),
+			cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
+			print(lm_list[4])
+		c_time = time.time()
+		fps = 1 / (c_time - p_time) if (c_time - p_time) != 0 else 0
+		p_time = c_time
 		
+		cv2.putText(img, f"FPS: {int(fps)}", (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
+		cv2.imshow("Hand Detection", img)
+		if cv2.waitKey(1) & 0xFF == ord('q'):
+			break
 		
+	source.stop()
+	cv2.destroyAllWindows()
@@ -0,0 +1,88 @@
+import numpy as np
+
+
+# Landmarks averaged for the palm position used to follow a hand: wrist and finger base joints
+PALM_IDS = [0, 5, 9, 13, 17]
+
+
+# Keeps the identity of every detected hand stable across frames, so each hand can keep its
+# own drawing state. Hands are matched to known tracks by nearest palm position, and a hand
+# is never matched to a track of the other handedness (when the detector reports it).
+# Tracks not seen for timeout seconds are forgotten.
+class HandTracker:
+    def __init__(self, max_distance = 200, timeout = 2.0):
+        self.max_distance = max_distance # largest palm movement in pixels between frames of the same hand
+        self.timeout = timeout
+        self.next_id = 0
+        self.track_ids = []
+        self.positions = np.zeros((0, 2), np.float32)
+        self.labels = []
+        self.last_seen = []
+
+    # landmarks: (hands, 21, 3) [id, x, y] pixel landmarks of the frame
+    # handedness: list of "Left"/"Right" labels per hand, or None when unknown
+    # Returns the track id of every hand, in landmark order
+    def update(self, landmarks, handedness, current_time):
+        self.forget(current_time)
+        hands = len(landmarks)
+        if handedness is None:
+            handedness = [None] * hands
+        positions = landmarks[:, PALM_IDS, 1:].mean(axis=1) if hands else np.zeros((0, 2), np.float32)
+
+        # Distance from every hand to every track, all at once
+        distances = np.linalg.norm(positions[:, None, :] - self.positions[None, :, :], axis=2)
+        for h, label in enumerate(handedness):
+            for t, track_label in enumerate(self.labels):
+                if label is not None and track_label is not None and label != track_label:
+                    distances[h, t] = np.inf
+        distances[distances > self.max_distance] = np.inf
+
+        # Greedy matching, closest pairs first
+        assigned = [None] * hands
+        used_tracks = set()
+        for flat in np.argsort(distances, axis=None):
+            h, t = divmod(int(flat), distances.shape[1])
+            if not np.isfinite(distances[h, t]):
+                break
+            if assigned[h] is None and t not in used_tracks:
+                assigned[h] = t
+                used_tracks.add(t)
+
+        ids = []
+        for h in range(hands):
+            t = assigned[h]
+            if t is None:
+                # New hand
+                self.track_ids.append(self.next_id)
+                self.positions = np.vstack([self.positions, positions[h:h + 1].astype(np.float32)])
+                self.labels.append(handedness[h])
+                self.last_seen.append(current_time)
+                ids.append(self.next_id)
+                self.next_id += 1
+            else:
+                self.positions[t] = positions[h]
+                self.labels[t] = handedness[h] if handedness[h] is not None else self.labels[t]
+                self.last_seen[t] = current_time
+                ids.append(self.track_ids[t])
+        return ids
+
+    # Drop tracks not seen for timeout seconds, returns their ids
+    def forget(self, current_time):
+        keep = [i for i, seen in enumerate(self.last_seen) if current_time - seen <= self.timeout]
+        if len(keep) == len(self.track_ids):
+            return []
+        forgotten = [track_id for i, track_id in enumerate(self.track_ids) if i not in keep]
+        self.track_ids = [self.track_ids[i] for i in keep]
+        self.positions = self.positions[keep]
+        self.labels = [self.labels[i] for i in keep]
+        self.last_seen = [self.last_seen[i] for i in keep]
+        return forgotten
+
+    def clear(self):
+        self.track_ids = []
+        self.positions = np.zeros((0, 2), np.float32)
+        self.labels = []
+        self.last_seen = []
+
+    def __contains__(self, track_id):
+        return track_id in self.track_ids
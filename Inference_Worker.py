@@ -0,0 +1,183 @@
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from Landmark_Trace import TraceResults
+
+
+# MediaPipe hand inference in a separate process, so the model and the OpenCV render loop
+# no longer share one interpreter (and one core through the GIL).
+#
+# Frames are handed over through a ring of preallocated shared memory frame buffers: the
+# main process copies a frame into a free slot and only sends the slot number and a few
+# parameters through a queue. The worker crops/downscales the frame straight from shared
+# memory and sends back the normalized landmarks (hands, 21, 2) and handedness labels, a
+# few hundred bytes per frame. Requests are asynchronous: the caller keeps using the last
+# result while the next frame is inferred.
+
+
+# Result of a worker inference, with the handedness labels reported by MediaPipe
+class WorkerResults(TraceResults):
+    def __init__(self, landmark_array, labels):
+        super().__init__(landmark_array)
+        self.labels = labels
+
+
+# Shared memory frame buffers, slots of max_shape (height, width, 3) uint8 each
+class SharedFrameRing:
+    def __init__(self, slots, max_shape, name = None):
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        size = slots * int(np.prod(self.max_shape))
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(create=True, size=size) if self.owner else shared_memory.SharedMemory(name=name)
+        self.frames = np.ndarray((slots,) + self.max_shape, np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    # Copy img into slot, returns the (height, width) of the copied frame
+    def write(self, slot, img):
+        h, w = img.shape[:2]
+        if h > self.max_shape[0] or w > self.max_shape[1]:
+            raise ValueError(f"Frame of {w}x{h} does not fit the {self.max_shape[1]}x{self.max_shape[0]} shared frame buffers")
+        self.frames[slot, :h, :w] = img
+        return h, w
+
+    def read(self, slot, h, w):
+        return self.frames[slot, :h, :w]
+
+    def close(self):
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# Worker process: run the model on every requested frame until a None request arrives.
+# With crops, crops are inferred by a second model instance (see HandDetectorMP.roi_hands).
+def _worker_main(ring_name, slots, max_shape, hands_args, crops, requests, results):
+    try:
+        import mediapipe as mp
+        hands = mp.solutions.hands.Hands(*hands_args)
+        roi_hands = mp.solutions.hands.Hands(*hands_args) if crops else hands
+        ring = SharedFrameRing(slots, max_shape, ring_name)
+    except Exception as e:
+        results.put(("error", repr(e)))
+        return
+    results.put(("ready", None))
+
+    try:
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            slot, seq, h, w, roi, size = request
+            img = ring.read(slot, h, w)
+            if roi is not None:
+                x1, y1, x2, y2 = roi
+                img = img[y1:y2, x1:x2]
+            if size is not None and (img.shape[1], img.shape[0]) != tuple(size):
+                img = cv2.resize(img, tuple(size), interpolation = cv2.INTER_AREA)
+            else:
+                img = img.copy() # the slot is reused once the result is sent
+            output = (hands if roi is None else roi_hands).process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+
+            points = np.zeros((0, 21, 2), np.float32)
+            labels = None
+            if output.multi_hand_landmarks:
+                points = np.array([[(lm.x, lm.y) for lm in hand_lms.landmark] for hand_lms in output.multi_hand_landmarks], dtype=np.float32)
+            if output.multi_handedness:
+                labels = [hand.classification[0].label for hand in output.multi_handedness]
+            results.put(("result", (slot, seq, points, labels)))
+    except Exception as e:
+        results.put(("error", repr(e)))
+    finally:
+        hands.close()
+        if roi_hands is not hands:
+            roi_hands.close()
+        ring.close()
+
+
+# Main process side of the worker. submit() hands a frame to the worker if a slot is free,
+# poll() returns the newest finished result (or None). Every result comes back with the
+# request information passed to submit(). crops loads a second model for cropped requests.
+class InferenceWorker:
+    def __init__(self, max_shape, hands_args, slots = 2, start_timeout = 60.0, crops = False):
+        context = multiprocessing.get_context("spawn")
+        self.ring = SharedFrameRing(slots, max_shape)
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(target=_worker_main, name="hand-inference",
+                                       args=(self.ring.name, slots, self.ring.max_shape, hands_args, crops, self.requests, self.results),
+                                       daemon=True)
+        self.free_slots = list(range(slots))
+        self.pending = {} # seq -> request info of frames being inferred
+        self.next_seq = 0
+        self.process.start()
+        self.wait_ready(start_timeout)
+
+    # Wait for the worker to load the model, raises RuntimeError if it fails to start
+    def wait_ready(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                kind, payload = self.results.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if not self.process.is_alive() or time.monotonic() > deadline:
+                    self.close()
+                    raise RuntimeError("Hand inference worker exited during startup" if not self.process.is_alive()
+                                       else f"Hand inference worker did not start within {timeout} seconds")
+        if kind != "ready":
+            self.close()
+            raise RuntimeError(f"Hand inference worker failed to start: {payload}")
+
+    @property
+    def busy(self):
+        return not self.free_slots
+
+    # Queue inference of img (cropped to roi (x1, y1, x2, y2) and downscaled to size, when given).
+    # Returns False, without copying the frame, when every slot is still being inferred.
+    def submit(self, img, roi = None, size = None, info = None):
+        if not self.free_slots:
+            return False
+        slot = self.free_slots.pop()
+        h, w = self.ring.write(slot, img)
+        seq = self.next_seq
+        self.next_seq += 1
+        self.pending[seq] = info
+        self.requests.put((slot, seq, h, w, roi, None if size is None else tuple(size)))
+        return True
+
+    # Newest finished result as (WorkerResults, info), or None if no inference finished since the
+    # last call. Older finished results are dropped. Waits up to timeout seconds for one.
+    def poll(self, timeout = 0.0):
+        newest = None
+        while True:
+            try:
+                if newest is None and timeout > 0:
+                    kind, payload = self.results.get(timeout=timeout)
+                else:
+                    kind, payload = self.results.get_nowait()
+            except queue.Empty:
+                if newest is None and self.pending and not self.process.is_alive():
+                    raise RuntimeError("Hand inference worker exited")
+                break
+            if kind == "error":
+                raise RuntimeError(f"Hand inference worker failed: {payload}")
+            slot, seq, points, labels = payload
+            self.free_slots.append(slot)
+            newest = (WorkerResults(points, labels), self.pending.pop(seq))
+        return newest
+
+    def close(self):
+        if self.process.is_alive():
+            self.requests.put(None)
+            self.process.join(timeout=2.0)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.ring.close()
@@ -0,0 +1,55 @@
+import math
+import numpy as np
+
+
+# One-Euro filter (Casiez et al.) over the landmarks of every tracked hand, each hand filtered as one array.
+# Slow movements are smoothed strongly (cutoff near min_cutoff, removes jitter) while fast
+# movements raise the cutoff by beta per pixel/second of speed, so the filtered fingertip
+# does not lag behind quick strokes. The filtered positions can be extrapolated forward
+# along the filtered velocity to hide the latency between capture and display.
+class LandmarkFilter:
+    def __init__(self, min_cutoff = 1.0, beta = 0.05, d_cutoff = 1.0, reset_after = 0.5):
+        self.min_cutoff = min_cutoff # Hz
+        self.beta = beta
+        self.d_cutoff = d_cutoff # Hz, cutoff of the velocity estimate
+        self.reset_after = reset_after # seconds without a hand after which its filter restarts
+        self.states = {} # hand id -> (time, positions (21, 2), velocities (21, 2))
+
+    @staticmethod
+    def alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    # landmarks: (hands, 21, 3) [id, x, y] array, hand_ids: track id per hand, current_time in seconds.
+    # lead: seconds to extrapolate forward (0 for smoothing only).
+    # Returns the filtered landmarks as a new int32 array of the same shape.
+    def apply(self, hand_ids, landmarks, current_time, lead = 0.0):
+        filtered = landmarks.copy()
+        for h, hand_id in enumerate(hand_ids):
+            x = landmarks[h, :, 1:].astype(np.float32)
+            state = self.states.get(hand_id)
+            if state is not None and current_time == state[0]:
+                continue # same timestamp, keep the raw landmarks
+            if state is None or not 0 < current_time - state[0] <= self.reset_after:
+                # New hand or hand back after a while: start from the measurement
+                self.states[hand_id] = (current_time, x, np.zeros_like(x))
+                continue
+
+            t_prev, x_prev, dx_prev = state
+            dt = current_time - t_prev
+            a_d = self.alpha(self.d_cutoff, dt)
+            dx = a_d * (x - x_prev) / dt + (1 - a_d) * dx_prev
+            cutoff = self.min_cutoff + self.beta * np.linalg.norm(dx, axis=1, keepdims=True)
+            a = self.alpha(cutoff, dt)
+            x_hat = a * x + (1 - a) * x_prev
+            self.states[hand_id] = (current_time, x_hat, dx)
+            filtered[h, :, 1:] = np.rint(x_hat + dx * lead)
+        return filtered
+
+    # Drop the state of hands for which keep(hand_id) is False
+    def forget(self, keep):
+        for hand_id in [hand_id for hand_id in self.states if not keep(hand_id)]:
+            del self.states[hand_id]
+
+    def clear(self):
+        self.states = {}
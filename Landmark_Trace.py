@@ -0,0 +1,197 @@
+import json
+import os
+import numpy as np
+
+
+# Landmark traces store the normalized (0 to 1) x, y position of the 21 hand landmarks
+# of every detected hand, frame by frame. In memory a trace is a float32 array of shape
+# (frames, max_hands, 21, 2) where absent hands are NaN.
+#
+# File formats:
+#   .npz   - array "landmarks" with the shape above
+#   .jsonl - one line per frame: {"hands": [[[x, y], ... 21 points], ...]}
+
+
+def load_trace(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npz":
+        with np.load(path) as data:
+            landmarks = np.asarray(data["landmarks"], dtype=np.float32)
+        if landmarks.ndim == 3:
+            # Single hand trace of shape (frames, 21, 2)
+            landmarks = landmarks[:, None]
+        return landmarks
+    elif ext == ".jsonl":
+        frames = []
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    frames.append(json.loads(line).get("hands") or [])
+        max_hands = max([len(hands) for hands in frames] + [1])
+        landmarks = np.full((len(frames), max_hands, 21, 2), np.nan, dtype=np.float32)
+        for i, hands in enumerate(frames):
+            for h, points in enumerate(hands):
+                landmarks[i, h] = points
+        return landmarks
+    raise ValueError(f"Unsupported landmark trace format: {path} (expected .npz or .jsonl)")
+
+
+def save_trace(path, landmarks):
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npz":
+        np.savez_compressed(path, landmarks=landmarks)
+    elif ext == ".jsonl":
+        with open(path, "w") as f:
+            for frame in landmarks:
+                f.write(json.dumps({"hands": frame_hands(frame)}) + "\n")
+    else:
+        raise ValueError(f"Unsupported landmark trace format: {path} (expected .npz or .jsonl)")
+
+
+# Hands present in one trace frame, as lists of [x, y] points
+def frame_hands(frame):
+    return [np.round(hand, 5).tolist() for hand in frame if not np.isnan(hand).any()]
+
+
+# Stand-ins for the MediaPipe result objects, so replayed frames go through the same
+# code as live detection. landmark_array holds the (hands, 21, 2) normalized points; the
+# per-landmark objects are only built if something asks for them (e.g. drawing).
+class TraceLandmark:
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.z = 0.0
+
+
+class TraceHand:
+    def __init__(self, points):
+        self.landmark = [TraceLandmark(x, y) for x, y in points.tolist()]
+
+
+class TraceResults:
+    def __init__(self, landmark_array):
+        self.landmark_array = landmark_array
+        self.multi_handedness = None
+        self._hands = None
+
+    @property
+    def multi_hand_landmarks(self):
+        if len(self.landmark_array) == 0:
+            return None
+        if self._hands is None:
+            self._hands = [TraceHand(points) for points in self.landmark_array]
+        return self._hands
+
+
+# Plays a trace back one frame per call
+class TracePlayer:
+    def __init__(self, path, loop = False):
+        self.landmarks = load_trace(path)
+        self.present = ~np.isnan(self.landmarks).any(axis=(2, 3))
+        self.loop = loop
+        self.position = 0
+
+    @property
+    def finished(self):
+        return not self.loop and self.position >= len(self.landmarks)
+
+    def __len__(self):
+        return len(self.landmarks)
+
+    # Results for the next frame (no hands once a non-looping trace has ended)
+    def next_results(self):
+        if self.position >= len(self.landmarks):
+            if not self.loop or len(self.landmarks) == 0:
+                return TraceResults(np.zeros((0, 21, 2), np.float32))
+            self.position = 0
+        frame = self.position
+        self.position += 1
+        return TraceResults(self.landmarks[frame][self.present[frame]])
+
+
+# Records landmarks frame by frame. JSONL traces are written as frames arrive,
+# NPZ traces are written on close().
+class TraceRecorder:
+    def __init__(self, path, max_hands = 2):
+        self.path = path
+        self.max_hands = max_hands
+        self.frames = []
+        self.file = None
+        if os.path.splitext(path)[1].lower() == ".jsonl":
+            self.file = open(path, "w")
+        elif os.path.splitext(path)[1].lower() != ".npz":
+            raise ValueError(f"Unsupported landmark trace format: {path} (expected .npz or .jsonl)")
+
+    # points: (hands, 21, 2) normalized landmarks of the frame
+    def record(self, points):
+        points = np.asarray(points, dtype=np.float32)[:self.max_hands]
+        if self.file is not None:
+            self.file.write(json.dumps({"hands": frame_hands(points)}) + "\n")
+        else:
+            frame = np.full((self.max_hands, 21, 2), np.nan, dtype=np.float32)
+            frame[:len(points)] = points
+            self.frames.append(frame)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        elif self.frames:
+            save_trace(self.path, np.stack(self.frames))
+            self.frames = []
+
+
+# Command line options for replaying and recording traces
+def add_trace_arguments(parser):
+    parser.add_argument("--replay-landmarks", metavar="TRACE",
+                        help="replay hand landmarks from a trace file (.npz/.jsonl) instead of running MediaPipe")
+    parser.add_argument("--loop-landmarks", action="store_true", help="restart the landmark trace when it ends")
+    parser.add_argument("--record-landmarks", metavar="TRACE",
+                        help="record the detected hand landmarks of every frame to a trace file (.npz/.jsonl)")
+
+
+# Hand pose used for generated traces: landmark offsets (normalized units, image aspect
+# ignored) from the index finger tip, with the index finger up and the others curled
+DRAW_POSE = np.array([
+    [0.04, 0.20],                                               # wrist
+    [0.07, 0.17], [0.09, 0.14], [0.10, 0.11], [0.11, 0.09],    # thumb, tip to the right of its IP joint
+    [0.02, 0.10], [0.01, 0.06], [0.005, 0.03], [0.0, 0.0],     # index finger, tip above its PIP joint
+    [0.04, 0.10], [0.04, 0.07], [0.04, 0.08], [0.04, 0.09],    # middle finger, tip below its PIP joint
+    [0.06, 0.11], [0.06, 0.08], [0.06, 0.09], [0.06, 0.10],    # ring finger
+    [0.08, 0.12], [0.08, 0.10], [0.08, 0.11], [0.08, 0.12]     # pinky
+], dtype=np.float32)
+
+# Same pose with the middle finger raised as well (selection gesture, lifts the pen)
+SELECT_POSE = DRAW_POSE.copy()
+SELECT_POSE[10:13] = [[0.04, 0.05], [0.04, 0.025], [0.04, 0.0]]
+
+
+# Generate a deterministic drawing trace: the index finger tip follows a Lissajous curve
+# below the header, and every stroke_frames frames the pen is lifted for lift_frames frames.
+def generate_trace(num_frames, stroke_frames = 90, lift_frames = 5, speed = 0.02, header_fraction = 0.12):
+    t = np.arange(num_frames, dtype=np.float32) * speed
+    tip_x = 0.5 + 0.35 * np.sin(3 * t)
+    tip_y = header_fraction + (1 - header_fraction) * (0.5 + 0.3 * np.sin(2 * t + 0.5))
+
+    lifted = (np.arange(num_frames) % (stroke_frames + lift_frames)) >= stroke_frames
+    poses = np.where(lifted[:, None, None], SELECT_POSE, DRAW_POSE)
+    landmarks = poses + np.stack([tip_x, tip_y], axis=1)[:, None, :]
+    return np.clip(landmarks, 0.0, 1.0)[:, None]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic landmark trace for load testing")
+    parser.add_argument("output", help="trace file to write (.npz or .jsonl)")
+    parser.add_argument("--frames", type=int, default=10000, help="number of frames to generate")
+    parser.add_argument("--stroke-frames", type=int, default=90, help="frames drawn before the pen is lifted")
+    parser.add_argument("--speed", type=float, default=0.02, help="fingertip speed along the curve")
+    args = parser.parse_args()
+
+    save_trace(args.output, generate_trace(args.frames, args.stroke_frames, speed=args.speed))
+    print(f"Wrote {args.frames} frames to {args.output}")
@@ -0,0 +1,207 @@
+import collections
+import cProfile
+import csv
+import io
+import json
+import os
+import pstats
+import time
+import cv2
+import numpy as np
+
+
+# Runtime metrics of the frame loop, cheap enough to leave on: recording a value is a
+# deque append (safe from the capture/inference threads too) and statistics are only
+# computed when a snapshot is taken (by the HUD and the metrics log, a few times per second).
+#
+# - stage timings: seconds per call of each stage (inference, update, render, compose, ...)
+#   over the last window samples
+# - counters: totals since start (dropped frames, frames, ...)
+# - gauges: last value set (stroke count, ...)
+# - frame rate and hand presence over the last window displayed frames
+#
+# Stages, counters and gauges passed to the constructor are part of every snapshot from the
+# start (counters and gauges at 0, stage timings empty until the first call), others appear
+# once they are first recorded.
+class Metrics:
+    def __init__(self, window = 120, target_fps = 0.0, stages = (), counters = (), gauges = ()):
+        self.window = window
+        self.target_fps = target_fps
+        self.stages = {stage: collections.deque(maxlen=window) for stage in stages}
+        self.counters = collections.Counter(dict.fromkeys(("frames",) + tuple(counters), 0))
+        self.gauges = dict.fromkeys(gauges, 0)
+        self.frame_times = collections.deque(maxlen=window)
+        self.hands_present = collections.deque(maxlen=window)
+        self.start_time = time.perf_counter()
+
+    # Record the duration in seconds of one call of stage
+    def record(self, stage, seconds):
+        samples = self.stages.get(stage)
+        if samples is None:
+            samples = self.stages.setdefault(stage, collections.deque(maxlen=self.window))
+        samples.append(seconds)
+
+    def count(self, name, n = 1):
+        self.counters[name] += n
+
+    def set(self, name, value):
+        self.gauges[name] = value
+
+    # Mark the end of a displayed frame
+    def frame(self, hands):
+        self.frame_times.append(time.perf_counter())
+        self.hands_present.append(hands > 0)
+        self.counters["frames"] += 1
+
+    @property
+    def fps(self):
+        frame_times = list(self.frame_times)
+        if len(frame_times) < 2 or frame_times[-1] <= frame_times[0]:
+            return 0.0
+        return (len(frame_times) - 1) / (frame_times[-1] - frame_times[0])
+
+    # Current values as a flat dict: fps, hand_present_ratio, <stage>_ms (mean) and
+    # <stage>_p95_ms per stage (None before the first call), the counters and the gauges
+    def snapshot(self):
+        fps = self.fps
+        hands_present = list(self.hands_present)
+        values = {"time": time.time(), "uptime_s": round(time.perf_counter() - self.start_time, 1),
+                  "fps": round(fps, 2),
+                  "below_target": bool(self.target_fps > 0 and len(self.frame_times) > 1 and fps < self.target_fps),
+                  "hand_present_ratio": round(sum(hands_present) / len(hands_present), 3) if hands_present else 0.0}
+        for stage, samples in list(self.stages.items()):
+            ms = np.asarray(samples) * 1000.0
+            values[f"{stage}_ms"] = round(float(ms.mean()), 3) if len(ms) else None
+            values[f"{stage}_p95_ms"] = round(float(np.percentile(ms, 95)), 3) if len(ms) else None
+        values.update(self.counters)
+        values.update(self.gauges)
+        return values
+
+
+# Appends metrics snapshots to a log file, one row per interval seconds. The format follows the
+# file extension: .csv or .jsonl. A CSV file keeps the columns of its header row (the first
+# snapshot written, or the existing header when continuing a log): missing values are left
+# empty and values without a column are not written, so declare every value in Metrics.
+# When the file grows beyond max_bytes it is rotated: path -> path.1 -> ... -> path.<backups>.
+class MetricsLog:
+    def __init__(self, path, interval = 5.0, max_bytes = 1000000, backups = 3):
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in (".csv", ".jsonl"):
+            raise ValueError(f"Unsupported metrics log format: {path} (expected .csv or .jsonl)")
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.is_csv = ext == ".csv"
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.columns = None
+        self.last_write = None
+        self.file = None
+
+    def due(self, now):
+        return self.last_write is None or now - self.last_write >= self.interval
+
+    def write(self, values, now = None):
+        self.last_write = time.perf_counter() if now is None else now
+        if self.is_csv:
+            self.write_csv(values)
+            return
+        if self.file is None:
+            self.file = open(self.path, "a")
+        self.file.write(json.dumps(values) + "\n")
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def write_csv(self, values):
+        if self.file is None:
+            # Continue an existing log with its own columns
+            self.columns = None
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                with open(self.path, newline="") as f:
+                    self.columns = next(csv.reader(f), None)
+            self.file = open(self.path, "a", newline="")
+        if self.columns is None:
+            self.columns = list(values)
+            csv.writer(self.file).writerow(self.columns)
+        csv.writer(self.file).writerow([values.get(column, "") for column in self.columns])
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self.close()
+        for i in range(self.backups, 0, -1):
+            source = self.path if i == 1 else f"{self.path}.{i - 1}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i}")
+        if self.backups == 0:
+            os.remove(self.path)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+# cProfile over a number of frames: profiling starts on the first call of frame() and stops
+# after frames calls, then the statistics are written to path (readable with pstats/snakeviz)
+# and the top entries by cumulative time are printed.
+class FrameProfiler:
+    def __init__(self, frames, path = "aircanvas.prof", top = 25):
+        self.frames = frames
+        self.path = path
+        self.top = top
+        self.profile = cProfile.Profile()
+        self.seen = 0
+        self.done = frames <= 0
+
+    def frame(self):
+        if self.done:
+            return
+        if self.seen == 0:
+            self.profile.enable()
+        self.seen += 1
+        if self.seen > self.frames:
+            self.finish()
+
+    def finish(self):
+        if self.done:
+            return
+        self.done = True
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
+        text = io.StringIO()
+        pstats.Stats(self.profile, stream=text).sort_stats("cumulative").print_stats(self.top)
+        print(f"Profiled {min(self.seen, self.frames)} frames, statistics written to {self.path}")
+        print(text.getvalue())
+
+
+# Lines shown by the metrics HUD
+def hud_lines(values):
+    lines = [f"FPS {values['fps']:.1f}" + ("  BELOW TARGET" if values["below_target"] else "")]
+    for stage in ("inference", "update", "render", "compose"):
+        if values.get(f"{stage}_ms") is not None:
+            lines.append(f"{stage} {values[stage + '_ms']:.1f} ms (p95 {values[stage + '_p95_ms']:.1f})")
+    lines.append(f"strokes {values.get('strokes', 0)}  hands {values['hand_present_ratio'] * 100:.0f}%")
+    lines.append(f"dropped {values.get('dropped_frames', 0)}")
+    return lines
+
+
+# HUD panel image with the given lines, rendered once per refresh and pasted every frame
+# (drawing the text every frame would cost more than the rest of the metrics)
+def hud_panel(lines, width = 360, line_height = 24):
+    panel = np.full((line_height * len(lines) + 12, width, 3), 32, np.uint8)
+    for i, line in enumerate(lines):
+        cv2.putText(panel, line, (10, line_height * (i + 1)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+    return panel
+
+
+# Paste a HUD panel onto img, below the header at the left
+def draw_hud(img, panel, origin = (20, 140)):
+    x, y = origin
+    height, width = min(panel.shape[0], img.shape[0] - y), min(panel.shape[1], img.shape[1] - x)
+    if height > 0 and width > 0:
+        img[y:y + height, x:x + width] = panel[:height, :width]
@@ -0,0 +1,287 @@
+import http.server
+import threading
+import time
+import cv2
+from Pipeline import DropOldestQueue
+
+
+# Output sinks for the composed frames. The display window runs on the caller's thread (OpenCV
+# windows must be driven from the main thread); every other sink works on its own thread, fed
+# through a one-frame latest-wins buffer (DropOldestQueue), so a slow encoder, disk or client
+# drops frames instead of slowing down the frame loop.
+#
+# Frames are handed over without a copy: the frame loop produces a new image every frame and
+# never touches it again after writing it to the sinks.
+class OutputSink:
+    def start(self):
+        return self
+
+    def write(self, frame):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    # Frames this sink skipped because it fell behind
+    @property
+    def dropped(self):
+        return 0
+
+
+# Discards every frame (headless runs without any output)
+class NullSink(OutputSink):
+    def __init__(self):
+        self.frames = 0
+
+    def write(self, frame):
+        self.frames += 1
+
+
+# Shows frames in an OpenCV window, see poll_key for the keyboard
+class WindowSink(OutputSink):
+    def __init__(self, name = "Canvas"):
+        self.name = name
+        self.opened = False
+
+    def start(self):
+        cv2.namedWindow(self.name, cv2.WINDOW_NORMAL)
+        self.opened = True
+        return self
+
+    def write(self, frame):
+        cv2.imshow(self.name, frame)
+
+    def close(self):
+        if self.opened:
+            cv2.destroyWindow(self.name)
+            self.opened = False
+
+
+# Base of sinks that consume frames on their own thread: consume(frame) is called with the
+# newest frame whenever the thread is free
+class ThreadedSink(OutputSink):
+    def __init__(self, name):
+        self.name = name
+        self.frames = DropOldestQueue(1)
+        self.thread = None
+        self.error = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        try:
+            while True:
+                frame = self.frames.get()
+                if frame is None:
+                    break
+                self.consume(frame)
+        except Exception as e:
+            self.error = e
+            print(f"ERROR: Output {self.name} stopped: {e}")
+        finally:
+            self.finish()
+
+    def consume(self, frame):
+        raise NotImplementedError
+
+    # Called on the sink thread once no more frames will come
+    def finish(self):
+        pass
+
+    def write(self, frame):
+        if self.error is None:
+            self.frames.put(frame)
+
+    @property
+    def dropped(self):
+        return self.frames.dropped
+
+    def close(self):
+        self.frames.close()
+        if self.thread is not None:
+            self.thread.join(timeout=5.0)
+            self.thread = None
+
+
+# Records frames to a video file with cv2.VideoWriter. The writer is opened with the size of
+# the first frame. Frames dropped while the writer is busy are missing from the recording,
+# so a recording made on a machine too slow to keep up plays back faster than real time.
+class VideoRecorder(ThreadedSink):
+    def __init__(self, path, fps = 20.0, codec = "mp4v"):
+        super().__init__("video-recorder")
+        self.path = path
+        self.fps = fps
+        self.codec = codec
+        self.writer = None
+
+    def consume(self, frame):
+        if self.writer is None:
+            height, width = frame.shape[:2]
+            self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.codec), self.fps, (width, height))
+            if not self.writer.isOpened():
+                raise RuntimeError(f"Could not open video file {self.path} for writing")
+        self.writer.write(frame)
+
+    def finish(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+# Serves the frames as an MJPEG stream over HTTP (http://host:port/ or /stream.mjpg, and
+# /snapshot.jpg for a single frame). JPEG encoding runs on the sink thread and only while
+# a client is waiting for a frame; every client gets the newest encoded frame, so a slow
+# client skips frames without holding up the encoder or other clients.
+class MJPEGServer(ThreadedSink):
+    BOUNDARY = "aircanvasframe"
+
+    def __init__(self, port = 8080, host = "127.0.0.1", quality = 80, width = None):
+        super().__init__("mjpeg-encoder")
+        self.port = port
+        self.host = host
+        self.quality = quality
+        self.width = width # frames are downscaled to this width before encoding (None keeps full size)
+        self.jpeg = None
+        self.sequence = 0 # number of the last encoded frame
+        self.clients = 0 # requests waiting for frames
+        self.cond = threading.Condition()
+        self.closed = False
+        self.server = None
+        self.server_thread = None
+
+    def start(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path in ("/", "/stream.mjpg"):
+                    server.send_stream(self)
+                elif self.path == "/snapshot.jpg":
+                    server.send_snapshot(self)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1] # port 0 picks a free port
+        self.server_thread = threading.Thread(target=self.server.serve_forever, name="mjpeg-server", daemon=True)
+        self.server_thread.start()
+        return super().start()
+
+    def consume(self, frame):
+        if not self.clients:
+            return
+        if self.width is not None and frame.shape[1] > self.width:
+            height = round(frame.shape[0] * self.width / frame.shape[1])
+            frame = cv2.resize(frame, (self.width, height), interpolation = cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if ok:
+            with self.cond:
+                self.jpeg = jpeg.tobytes()
+                self.sequence += 1
+                self.cond.notify_all()
+
+    # Wait for a frame encoded after sequence, returns (sequence, jpeg) or None once closed
+    def next_jpeg(self, sequence, timeout = 5.0):
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while self.sequence <= sequence and not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+            if self.closed:
+                return None
+            return self.sequence, self.jpeg
+
+    def send_stream(self, handler):
+        handler.send_response(200)
+        handler.send_header("Cache-Control", "no-cache")
+        handler.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={self.BOUNDARY}")
+        handler.end_headers()
+        with self.cond:
+            self.clients += 1
+        try:
+            sequence = 0
+            while True:
+                latest = self.next_jpeg(sequence)
+                if latest is None:
+                    if self.closed:
+                        break
+                    continue
+                sequence, jpeg = latest
+                handler.wfile.write(f"--{self.BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode())
+                handler.wfile.write(jpeg)
+                handler.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass # client went away
+        finally:
+            with self.cond:
+                self.clients -= 1
+
+    def send_snapshot(self, handler):
+        with self.cond:
+            self.clients += 1
+            sequence = self.sequence
+        try:
+            latest = self.next_jpeg(sequence)
+        finally:
+            with self.cond:
+                self.clients -= 1
+        if latest is None:
+            handler.send_error(503, "No frame available")
+            return
+        jpeg = latest[1]
+        handler.send_response(200)
+        handler.send_header("Content-Type", "image/jpeg")
+        handler.send_header("Content-Length", str(len(jpeg)))
+        handler.end_headers()
+        handler.wfile.write(jpeg)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        super().close()
+
+
+# All outputs of the frame loop. poll_key() returns the key pressed in the window (255 for
+# none), a headless run has no window and never reports keys.
+class OutputSinks:
+    def __init__(self, sinks, window = None):
+        self.window = window
+        self.sinks = ([window] if window is not None else []) + list(sinks)
+        if not self.sinks:
+            self.sinks = [NullSink()]
+
+    def start(self):
+        for sink in self.sinks:
+            sink.start()
+        return self
+
+    def write(self, frame):
+        for sink in self.sinks:
+            sink.write(frame)
+
+    def poll_key(self):
+        if self.window is None:
+            return 255
+        return cv2.waitKey(1) & 0xFF
+
+    @property
+    def dropped(self):
+        return sum(sink.dropped for sink in self.sinks)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,116 @@
+import collections
+import threading
+import time
+
+
+# Bounded queue that never blocks the producer: when full, the oldest item is dropped
+# so consumers always get the freshest data and latency cannot build up.
+class DropOldestQueue:
+    def __init__(self, maxsize = 1):
+        self.items = collections.deque(maxlen=maxsize)
+        self.cond = threading.Condition()
+        self.dropped = 0  # number of items discarded because the consumer fell behind
+        self.closed = False
+
+    def put(self, item):
+        with self.cond:
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.cond.notify()
+
+    # Returns the oldest queued item, or None on timeout or once the queue is closed and empty
+    def get(self, timeout = None):
+        with self.cond:
+            if not self.items and not self.closed:
+                self.cond.wait(timeout)
+            if self.items:
+                return self.items.popleft()
+            return None
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+# Capture -> hand inference -> compositing/display pipeline.
+# Capture and inference each run on their own thread, connected by drop-oldest queues.
+# The compositing/display stage stays on the caller's thread (OpenCV windows must be
+# driven from the main thread) and pulls inference results with get().
+#
+# capture_fn() returns the next frame (or None if no frame was available)
+# infer_fn(frame) returns whatever the display stage needs for that frame
+# is_finished() optionally tells the capture stage that its source has no more frames
+class FramePipeline:
+    def __init__(self, capture_fn, infer_fn, queue_size = 1, is_finished = None):
+        self.capture_fn = capture_fn
+        self.infer_fn = infer_fn
+        self.is_finished = is_finished
+        self.frame_queue = DropOldestQueue(queue_size)
+        self.result_queue = DropOldestQueue(queue_size)
+        self.running = False
+        self.error = None  # first exception raised by a stage thread
+        self.threads = []
+
+    def start(self):
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="inference", daemon=True)
+        ]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def _capture_loop(self):
+        try:
+            while self.running:
+                frame = self.capture_fn()
+                if frame is None:
+                    if self.is_finished is not None and self.is_finished():
+                        break
+                    time.sleep(0.001)
+                    continue
+                self.frame_queue.put(frame)
+        except Exception as e:
+            self.error = self.error or e
+        finally:
+            self.frame_queue.close()
+
+    def _inference_loop(self):
+        try:
+            while self.running:
+                frame = self.frame_queue.get(timeout=0.1)
+                if frame is None:
+                    if self.frame_queue.closed:
+                        break
+                    continue
+                self.result_queue.put(self.infer_fn(frame))
+        except Exception as e:
+            self.error = self.error or e
+        finally:
+            self.result_queue.close()
+
+    # Next inference result for the display stage. Returns None on timeout or when the
+    # pipeline has shut down; a stage error is re-raised here on the caller's thread.
+    def get(self, timeout = None):
+        result = self.result_queue.get(timeout)
+        if result is None and self.error is not None:
+            raise self.error
+        return result
+
+    @property
+    def finished(self):
+        return self.result_queue.closed and not self.result_queue.items
+
+    @property
+    def dropped_frames(self):
+        return self.frame_queue.dropped + self.result_queue.dropped
+
+    def stop(self):
+        self.running = False
+        self.frame_queue.close()
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+        self.threads = []
@@ -0,0 +1,116 @@
+import os
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from Stroke_Store import STROKE_DTYPE
+
+
+# Canvas sessions are saved as .npz files holding the structured stroke records ("strokes",
+# see STROKE_DTYPE) and the canvas size. They load without any per-stroke parsing.
+def save_session(path, records, canvas_size):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    # Write to a temporary file first so an interrupted save never leaves a broken session
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, strokes=np.asarray(records, dtype=STROKE_DTYPE), canvas_size=np.asarray(canvas_size))
+    os.replace(tmp_path, path)
+
+
+# Returns (records, canvas_size) of a saved session
+def load_session(path):
+    with np.load(path) as data:
+        saved = data["strokes"]
+        canvas_size = tuple(data["canvas_size"].tolist()) if "canvas_size" in data else None
+    # Fields missing from older sessions keep their defaults
+    records = np.zeros(len(saved), dtype=STROKE_DTYPE)
+    records["path_id"] = -1
+    for name in saved.dtype.names:
+        if name in STROKE_DTYPE.names:
+            records[name] = saved[name]
+    return records, canvas_size
+
+
+# Saved sessions in a folder, oldest first
+def list_sessions(folder):
+    if not os.path.isdir(folder):
+        return []
+    sessions = [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".npz") and not f.endswith(".tmp.npz")]
+    return sorted(sessions, key=lambda path: (os.path.getmtime(path), path))
+
+
+# Most recently saved session in a folder, or None
+def latest_session(folder):
+    sessions = list_sessions(folder)
+    return sessions[-1] if sessions else None
+
+
+# Delete all but the newest keep sessions in a folder, with their PNG/SVG exports
+def prune_sessions(folder, keep):
+    sessions = list_sessions(folder)
+    for path in sessions[:max(len(sessions) - keep, 0)]:
+        base = os.path.splitext(path)[0]
+        for ext in (".npz", ".png", ".svg"):
+            if os.path.exists(base + ext):
+                os.remove(base + ext)
+
+
+def export_png(path, img_canvas):
+    cv2.imwrite(path, img_canvas)
+
+
+# Vector export: every polyline run (see CanvasLayer.polyline_runs) becomes an SVG polyline
+# with round caps and joins, like the lines OpenCV draws
+def export_svg(path, runs, width, height):
+    lines = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+             f'<rect width="{width}" height="{height}" fill="black"/>']
+    for points, color, thickness in runs:
+        blue, green, red = color
+        coords = " ".join(f"{x},{y}" for x, y in points)
+        lines.append(f'<polyline points="{coords}" fill="none" stroke="rgb({red},{green},{blue})" '
+                     f'stroke-width="{thickness}" stroke-linecap="round" stroke-linejoin="round"/>')
+    lines.append("</svg>")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+# File name for a new session (or export) in folder: session_<date>_<time with milliseconds>_<label><ext>.
+# Every call gets a later millisecond than the previous one, so saves never overwrite each other.
+_last_session_ms = 0
+
+def session_path(folder, label, ext = ".npz"):
+    global _last_session_ms
+    _last_session_ms = max(int(time.time() * 1000), _last_session_ms + 1)
+    stamp = time.strftime("session_%Y%m%d_%H%M%S", time.localtime(_last_session_ms / 1000)) + f"{_last_session_ms % 1000:03d}"
+    return os.path.join(folder, f"{stamp}_{label}{ext}")
+
+
+# Runs file writes on a background thread so saving never stalls the frame loop. Callers hand
+# over copies of the data they want written (taking a copy is cheap, writing is not).
+class SessionWriter:
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            fn, args = job
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"ERROR: Could not write {args[0]}: {e}")
+
+    # Queue fn(*args) to run on the writer thread
+    def submit(self, fn, *args):
+        self.jobs.put((fn, args))
+
+    # Finish the queued writes and stop the thread
+    def close(self):
+        self.jobs.put(None)
+        self.thread.join()
@@ -0,0 +1,96 @@
+# Uniform grid spatial index over stroke segments.
+# Each segment is registered (by key) in every grid cell its bounding rectangle covers,
+# so hit-testing a region only looks at the segments in the cells that region covers
+# instead of scanning every stroke.
+import numpy as np
+
+
+class SegmentGrid:
+    def __init__(self, cell_size = 64):
+        self.cell_size = cell_size
+        self.cells = {}      # (cell_x, cell_y) -> set of keys
+        self.key_cells = {}  # key -> list of (cell_x, cell_y) the key is registered in
+
+    # Range of grid cells covered by rectangle (x_min, y_min, x_max, y_max)
+    def _cell_range(self, rect):
+        x_min, y_min, x_max, y_max = rect
+        size = self.cell_size
+        return (int(x_min) // size, int(y_min) // size, int(x_max) // size, int(y_max) // size)
+
+    def insert(self, key, rect):
+        if key in self.key_cells:
+            self.remove(key)
+
+        cx_min, cy_min, cx_max, cy_max = self._cell_range(rect)
+        covered = []
+        for cx in range(cx_min, cx_max + 1):
+            for cy in range(cy_min, cy_max + 1):
+                self.cells.setdefault((cx, cy), set()).add(key)
+                covered.append((cx, cy))
+        self.key_cells[key] = covered
+
+    # Same as insert() for every key and integer rectangle, with the cell coverage of the whole
+    # batch computed at once (used to load large sessions)
+    def insert_many(self, keys, rects):
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(keys) < 32:
+            # Small batches are cheaper one by one
+            for key, rect in zip(keys.tolist(), np.asarray(rects).tolist()):
+                self.insert(key, rect)
+            return
+        for key in keys.tolist():
+            if key in self.key_cells:
+                self.remove(key)
+
+        cell_rects = np.floor_divide(np.asarray(rects, dtype=np.int64), self.cell_size)
+        nx = cell_rects[:, 2] - cell_rects[:, 0] + 1
+        ny = cell_rects[:, 3] - cell_rects[:, 1] + 1
+        counts = nx * ny
+        ends = np.cumsum(counts)
+        owner = np.repeat(np.arange(len(keys)), counts)
+        local = np.arange(ends[-1]) - np.repeat(ends - counts, counts)
+        cx = cell_rects[owner, 0] + local // ny[owner]
+        cy = cell_rects[owner, 1] + local % ny[owner]
+
+        # Keys per cell, grouped by sorting on a single cell number
+        cell_numbers = (cx - cx.min()) * (int(cy.max() - cy.min()) + 1) + (cy - cy.min())
+        order = np.argsort(cell_numbers, kind="stable")
+        sorted_numbers = cell_numbers[order]
+        starts = np.flatnonzero(np.concatenate([[True], sorted_numbers[1:] != sorted_numbers[:-1]]))
+        sorted_keys = keys[owner][order]
+        for start, end, first in zip(starts.tolist(), np.append(starts[1:], len(order)).tolist(), order[starts].tolist()):
+            self.cells.setdefault((int(cx[first]), int(cy[first])), set()).update(sorted_keys[start:end].tolist())
+
+        # Cells per key
+        covered = list(zip(cx.tolist(), cy.tolist()))
+        self.key_cells.update(zip(keys.tolist(), (covered[start:end] for start, end in zip((ends - counts).tolist(), ends.tolist()))))
+
+    def remove(self, key):
+        for cell in self.key_cells.pop(key, ()):
+            bucket = self.cells.get(cell)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.cells[cell]
+
+    # Keys whose cells overlap the rectangle. This is a superset of the keys whose
+    # rectangles overlap, callers run their exact test on the result.
+    def query(self, rect):
+        cx_min, cy_min, cx_max, cy_max = self._cell_range(rect)
+        found = set()
+        for cx in range(cx_min, cx_max + 1):
+            for cy in range(cy_min, cy_max + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        return found
+
+    def clear(self):
+        self.cells.clear()
+        self.key_cells.clear()
+
+    def __len__(self):
+        return len(self.key_cells)
+
+    def __contains__(self, key):
+        return key in self.key_cells
@@ -0,0 +1,351 @@
+import bisect
+import numpy as np
+from Spatial_Index import SegmentGrid
+
+
+# Record layout for one stroke segment
+STROKE_DTYPE = np.dtype([
+    ("x1", np.int32), ("y1", np.int32),   # segment start
+    ("x2", np.int32), ("y2", np.int32),   # segment end
+    ("color", np.uint8, 3),               # BGR color
+    ("thickness", np.int32),
+    ("t_stamp", np.float64),              # time the segment was drawn
+    ("is_eraser", np.bool_),
+    ("path_id", np.int64)                 # segments of one continuous line share a path id (-1 for none)
+])
+
+
+# Strokes expire by time bucket: all strokes with a time stamp in the same bucket_seconds long
+# window expire together, once the newest possible stroke of the bucket is older than lifetime
+def time_bucket(t_stamp, bucket_seconds):
+    return int(t_stamp // bucket_seconds)
+
+
+def bucket_expired(bucket, now, lifetime, bucket_seconds):
+    return now - (bucket + 1) * bucket_seconds > lifetime
+
+
+# Parameter interval [t_in, t_out] of every segment P(t) = P0 + t * (P1 - P0), 0 <= t <= 1, that lies
+# within radius of the segment e_start-e_end, i.e. inside the capsule around it. All segments are
+# handled at once: the capsule is the union of the discs at both ends and the rectangle between
+# them, each of which cuts a line in one interval. Segments that miss the capsule get t_in > t_out.
+def capsule_intervals(x1, y1, x2, y2, e_start, e_end, radius):
+    p0 = np.stack([x1, y1], axis=1).astype(np.float64)
+    d = np.stack([x2 - x1, y2 - y1], axis=1).astype(np.float64)
+    radius = np.broadcast_to(np.asarray(radius, dtype=np.float64), len(p0))
+    e_start = np.asarray(e_start, dtype=np.float64)
+    e_end = np.asarray(e_end, dtype=np.float64)
+    t_in = np.full(len(p0), np.inf)
+    t_out = np.full(len(p0), -np.inf)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Discs around both ends of the eraser movement: |P(t) - c| <= radius
+        a = (d * d).sum(axis=1)
+        for c in (e_start, e_end):
+            f = p0 - c
+            b = 2 * (f * d).sum(axis=1)
+            cc = (f * f).sum(axis=1) - radius * radius
+            root = np.sqrt(np.maximum(b * b - 4 * a * cc, 0.0))
+            lo = np.where(a > 0, (-b - root) / (2 * a), np.where(cc <= 0, 0.0, np.inf))
+            hi = np.where(a > 0, (-b + root) / (2 * a), np.where(cc <= 0, 1.0, -np.inf))
+            inside = (b * b - 4 * a * cc >= 0) | (a == 0)
+            t_in = np.where(inside & (lo <= hi), np.minimum(t_in, lo), t_in)
+            t_out = np.where(inside & (lo <= hi), np.maximum(t_out, hi), t_out)
+
+        # Rectangle along the eraser movement: 0 <= along <= length and |across| <= radius
+        length = np.hypot(*(e_end - e_start))
+        if length > 0:
+            u = (e_end - e_start) / length
+            n = np.array([-u[1], u[0]])
+            lo, hi = np.full(len(p0), -np.inf), np.full(len(p0), np.inf)
+            for v0, dv, low, high in (((p0 - e_start) @ u, d @ u, 0.0, length),
+                                      ((p0 - e_start) @ n, d @ n, -radius, radius)):
+                bound_a, bound_b = (low - v0) / dv, (high - v0) / dv
+                moving = dv != 0
+                lo = np.maximum(lo, np.where(moving, np.minimum(bound_a, bound_b), np.where((low <= v0) & (v0 <= high), -np.inf, np.inf)))
+                hi = np.minimum(hi, np.where(moving, np.maximum(bound_a, bound_b), np.where((low <= v0) & (v0 <= high), np.inf, -np.inf)))
+            t_in = np.where(lo <= hi, np.minimum(t_in, lo), t_in)
+            t_out = np.where(lo <= hi, np.maximum(t_out, hi), t_out)
+
+    return np.maximum(t_in, 0.0), np.minimum(t_out, 1.0)
+
+
+# Stroke storage backed by a preallocated structured array used as a ring buffer.
+# Each appended stroke gets an increasing id that stays valid until it is removed, and
+# records are kept in the order they were added (time order). Removed records leave a hole
+# that is reclaimed once the head of the ring moves past it. The store also keeps a
+# spatial index of its strokes up to date so callers can look up strokes by area, and groups
+# them by time bucket so expiring strokes never has to look at the ones that stay.
+class StrokeStore:
+    def __init__(self, capacity = 4096, cell_size = 64, bucket_seconds = 1.0):
+        self._data = np.zeros(capacity, dtype=STROKE_DTYPE)
+        self._alive = np.zeros(capacity, dtype=np.bool_)
+        self._start = 0      # slot of the oldest record
+        self._count = 0      # number of slots in use from _start, including holes
+        self._first_id = 0   # id of the record in slot _start
+        self._live = 0       # number of records not removed
+        self._erasers = 0    # number of eraser records not removed
+        self.index = SegmentGrid(cell_size)
+        self.bucket_seconds = bucket_seconds
+        self.buckets = {}       # time bucket -> ids of its stored strokes
+        self.bucket_order = []  # time buckets with strokes, oldest first
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def __len__(self):
+        return self._live
+
+    def __contains__(self, stroke_id):
+        offset = stroke_id - self._first_id
+        return 0 <= offset < self._count and bool(self._alive[(self._start + offset) % self.capacity])
+
+    # Slots of the used span of the ring, oldest first
+    def _span_slots(self):
+        return (self._start + np.arange(self._count)) % self.capacity
+
+    def _slots_for(self, stroke_ids):
+        stroke_ids = np.asarray(stroke_ids, dtype=np.int64)
+        offsets = stroke_ids - self._first_id
+        valid = (offsets >= 0) & (offsets < self._count)
+        slots = (self._start + offsets[valid]) % self.capacity
+        return stroke_ids[valid], slots
+
+    # Double the capacity, unrolling the ring so the oldest record lands in slot 0
+    def _grow(self, needed):
+        new_capacity = self.capacity
+        while new_capacity < needed:
+            new_capacity *= 2
+
+        slots = self._span_slots()
+        data = np.zeros(new_capacity, dtype=STROKE_DTYPE)
+        alive = np.zeros(new_capacity, dtype=np.bool_)
+        data[:self._count] = self._data[slots]
+        alive[:self._count] = self._alive[slots]
+        self._data, self._alive, self._start = data, alive, 0
+
+    # Index rectangle of records, padded by twice the stroke thickness so that the query
+    # rectangle of _eraser_hits (padded by twice the eraser thickness) finds every stroke erase() can reach
+    @staticmethod
+    def index_rects(records):
+        pad = 2 * records["thickness"]
+        return np.stack([np.minimum(records["x1"], records["x2"]) - pad,
+                         np.minimum(records["y1"], records["y2"]) - pad,
+                         np.maximum(records["x1"], records["x2"]) + pad,
+                         np.maximum(records["y1"], records["y2"]) + pad], axis=1).tolist()
+
+    # Append a structured array of records, returns their ids
+    def extend(self, records):
+        records = np.asarray(records, dtype=STROKE_DTYPE)
+        n = len(records)
+        if n == 0:
+            return np.zeros(0, dtype=np.int64)
+        if self._count + n > self.capacity:
+            self._grow(self._count + n)
+
+        slots = (self._start + self._count + np.arange(n)) % self.capacity
+        self._data[slots] = records
+        self._alive[slots] = True
+
+        stroke_ids = self._first_id + self._count + np.arange(n, dtype=np.int64)
+        self._count += n
+        self._live += n
+        self._erasers += int(np.count_nonzero(records["is_eraser"]))
+
+        self.index.insert_many(stroke_ids, self.index_rects(records))
+        self._add_to_buckets(stroke_ids, records["t_stamp"])
+        return stroke_ids
+
+    def append(self, x1, y1, x2, y2, color, thickness, t_stamp, is_eraser = False, path_id = -1):
+        color = np.clip(color, 0, 255) # out of range channels would overflow (or wrap) in uint8
+        record = np.array([(x1, y1, x2, y2, color, thickness, t_stamp, is_eraser, path_id)], dtype=STROKE_DTYPE)
+        return int(self.extend(record)[0])
+
+    def _add_to_buckets(self, stroke_ids, t_stamps):
+        keys = np.floor_divide(t_stamps, self.bucket_seconds).astype(np.int64)
+        if len(keys) and keys.min() == keys.max():
+            groups = [(int(keys[0]), stroke_ids.tolist())]
+        else:
+            order = np.argsort(keys, kind="stable")
+            keys, stroke_ids = keys[order], stroke_ids[order]
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            groups = [(int(keys[i]), ids.tolist()) for i, ids in zip(starts, np.split(stroke_ids, starts[1:]))]
+        for key, ids in groups:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = set()
+                bisect.insort(self.bucket_order, key)
+            bucket.update(ids)
+
+    # Move the end point of a stored segment (used to extend it). Its time stamp, and so its
+    # time bucket, stays that of its start. Returns False if the stroke is not stored.
+    def move_end(self, stroke_id, x2, y2):
+        if stroke_id not in self:
+            return False
+        slot = (self._start + stroke_id - self._first_id) % self.capacity
+        self._data["x2"][slot] = x2
+        self._data["y2"][slot] = y2
+        self.index.remove(stroke_id)
+        self.index.insert(stroke_id, self.index_rects(self._data[slot:slot + 1])[0])
+        return True
+
+    # Records for the given ids (ids that are not stored are skipped)
+    def get(self, stroke_ids):
+        stroke_ids, slots = self._slots_for(stroke_ids)
+        slots = slots[self._alive[slots]]
+        return self._data[slots]
+
+    # Ids and records of every stored stroke, oldest first
+    def items(self):
+        slots = self._span_slots()
+        alive = self._alive[slots]
+        return self._first_id + np.flatnonzero(alive), self._data[slots[alive]]
+
+    # Remove strokes by id, returns the removed records
+    def remove(self, stroke_ids):
+        stroke_ids, slots = self._slots_for(stroke_ids)
+        alive = self._alive[slots]
+        stroke_ids, slots = stroke_ids[alive], slots[alive]
+        if len(slots) == 0:
+            return self._data[:0].copy()
+
+        removed = self._data[slots]
+        self._alive[slots] = False
+        self._live -= len(slots)
+        self._erasers -= int(np.count_nonzero(removed["is_eraser"]))
+        keys = np.floor_divide(removed["t_stamp"], self.bucket_seconds).astype(np.int64).tolist()
+        for stroke_id, key in zip(stroke_ids.tolist(), keys):
+            self.index.remove(stroke_id)
+            bucket = self.buckets[key]
+            bucket.discard(stroke_id)
+            if not bucket:
+                del self.buckets[key]
+                self.bucket_order.remove(key)
+
+        self._trim_head()
+        return removed
+
+    # Advance the head of the ring past removed records
+    def _trim_head(self):
+        if self._live == 0:
+            self._first_id += self._count
+            self._start = 0
+            self._count = 0
+            return
+
+        slots = self._span_slots()
+        skip = int(np.argmax(self._alive[slots]))
+        self._start = (self._start + skip) % self.capacity
+        self._count -= skip
+        self._first_id += skip
+
+    # Time buckets whose strokes are all older than lifetime seconds (only the oldest buckets are looked at)
+    def expired_buckets(self, now, lifetime):
+        expired = []
+        for key in self.bucket_order:
+            if not bucket_expired(key, now, lifetime, self.bucket_seconds):
+                break
+            expired.append(key)
+        return expired
+
+    # Remove every stroke of the given time buckets, returns the removed records
+    def remove_buckets(self, keys):
+        stroke_ids = [stroke_id for key in keys for stroke_id in self.buckets.get(key, ())]
+        if not stroke_ids:
+            return self._data[:0].copy()
+        return self.remove(np.sort(np.array(stroke_ids, dtype=np.int64)))
+
+    # Remove the strokes of every time bucket older than lifetime seconds, returns the removed
+    # records. A stroke expires up to one bucket later than its own lifetime.
+    def expire(self, now, lifetime):
+        return self.remove_buckets(self.expired_buckets(now, lifetime))
+
+    # Ids of stored strokes whose index rectangle cells overlap rect, oldest first
+    def query(self, rect):
+        return np.array(sorted(self.index.query(rect)), dtype=np.int64)
+
+    # Ids of stored eraser strokes, oldest first (without scanning the store when it has none)
+    def eraser_ids(self):
+        if self._erasers == 0:
+            return np.zeros(0, dtype=np.int64)
+        slots = self._span_slots()
+        flagged = self._alive[slots] & self._data["is_eraser"][slots]
+        return self._first_id + np.flatnonzero(flagged)
+
+    # Ids, slots, records and hit intervals (see capsule_intervals) of the non-eraser strokes near
+    # an eraser movement. The eraser reaches eraser_thickness from its path, plus margin pixels.
+    def _eraser_hits(self, e_x_start, e_y_start, e_x_end, e_y_end, eraser_thickness, margin = 0.0):
+        pad = 2 * eraser_thickness
+        query_rect = (min(e_x_start, e_x_end) - pad, min(e_y_start, e_y_end) - pad,
+                      max(e_x_start, e_x_end) + pad, max(e_y_start, e_y_end) + pad)
+        candidate_ids, slots = self._slots_for(self.query(query_rect))
+        records = self._data[slots]
+        keep = ~records["is_eraser"]
+        candidate_ids, slots, records = candidate_ids[keep], slots[keep], records[keep]
+
+        # A stroke is hit when its line (thickness / 2 around its axis) reaches into the eraser
+        radius = eraser_thickness + records["thickness"] / 2.0 + margin
+        t_in, t_out = capsule_intervals(records["x1"], records["y1"], records["x2"], records["y2"],
+                                        (e_x_start, e_y_start), (e_x_end, e_y_end), radius)
+        hit = t_in <= t_out
+        return candidate_ids[hit], slots[hit], records[hit], t_in[hit], t_out[hit]
+
+    # Erase the parts of strokes within reach of an eraser movement. Strokes entirely inside are
+    # removed, strokes crossing the edge are shortened to the part outside and strokes cut in the
+    # middle are split in two (the second part is appended as a new stroke of the same path).
+    # Returns the affected records as they were before erasing, for redrawing their region.
+    def erase(self, e_x_start, e_y_start, e_x_end, e_y_end, eraser_thickness):
+        # Two pixels of margin so rounded cut points and line rasterization never leave a sliver inside the eraser
+        stroke_ids, slots, records, t_in, t_out = self._eraser_hits(e_x_start, e_y_start, e_x_end, e_y_end,
+                                                                    eraser_thickness, margin=2.0)
+        if len(stroke_ids) == 0:
+            return records
+
+        p0 = np.stack([records["x1"], records["y1"]], axis=1).astype(np.float64)
+        p1 = np.stack([records["x2"], records["y2"]], axis=1).astype(np.float64)
+        length = np.hypot(*(p1 - p0).T)
+        head_end = np.rint(p0 + t_in[:, None] * (p1 - p0)).astype(np.int32)
+        tail_start = np.rint(p0 + t_out[:, None] * (p1 - p0)).astype(np.int32)
+        keep_head = t_in * length >= 0.5
+        keep_tail = (1 - t_out) * length >= 0.5
+
+        # Tails of split strokes become new strokes, heads stay in place (keeps drawing order)
+        split = keep_head & keep_tail
+        tails = records[split].copy()
+        tails["x1"], tails["y1"] = tail_start[split].T
+
+        # Shorten in place: keep the head where there is one, otherwise the tail
+        head_only = keep_head
+        tail_only = keep_tail & ~keep_head
+        self._data["x2"][slots[head_only]], self._data["y2"][slots[head_only]] = head_end[head_only].T
+        self._data["x1"][slots[tail_only]], self._data["y1"][slots[tail_only]] = tail_start[tail_only].T
+        shortened = head_only | tail_only
+        for stroke_id, rect in zip(stroke_ids[shortened].tolist(), self.index_rects(self._data[slots[shortened]])):
+            self.index.remove(stroke_id)
+            self.index.insert(stroke_id, rect)
+
+        self.remove(stroke_ids[~shortened])
+        self.extend(tails)
+        return records
+
+    def clear(self):
+        self._alive[:] = False
+        self._first_id += self._count
+        self._start = 0
+        self._count = 0
+        self._live = 0
+        self._erasers = 0
+        self.index.clear()
+        self.buckets = {}
+        self.bucket_order = []
+
+    # Convert records to (x1, y1, x2, y2, color, thickness, t_stamp, is_eraser, path_id) tuples
+    @staticmethod
+    def to_tuples(records):
+        colors = [tuple(color) for color in records["color"].tolist()]
+        return list(zip(records["x1"].tolist(), records["y1"].tolist(),
+                        records["x2"].tolist(), records["y2"].tolist(),
+                        colors, records["thickness"].tolist(),
+                        records["t_stamp"].tolist(), records["is_eraser"].tolist(),
+                        records["path_id"].tolist()))
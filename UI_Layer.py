@@ -0,0 +1,197 @@
+import os
+import cv2
+import numpy as np
+import AirConfig
+
+
+# Header overlay images, loaded and resized the first time each one is needed instead of
+# all at startup. Failed loads are remembered so missing files are only reported once.
+# With a cache_folder, resized overlays are also kept on disk as raw arrays, keyed by the
+# overlay size and the source file's modification time, so later starts skip decoding and resizing.
+class OverlayCache:
+    def __init__(self, folder_path, overlay_paths, size, cache_folder = None):
+        self.folder_path = folder_path
+        self.overlay_paths = dict(overlay_paths)
+        self.size = size  # (width, height) of a header overlay
+        self.cache_folder = cache_folder
+        self.images = {}
+
+    # Cache file of a resized overlay, None without a cache folder
+    def cache_path(self, img_path):
+        if self.cache_folder is None:
+            return None
+        width, height = self.size
+        name = os.path.splitext(os.path.basename(img_path))[0]
+        return os.path.join(self.cache_folder, f"{name}_{width}x{height}_{os.stat(img_path).st_mtime_ns}.npy")
+
+    def load_cached(self, cache_path):
+        try:
+            image = np.load(cache_path)
+        except (OSError, ValueError):
+            return None
+        width, height = self.size
+        return image if image.shape == (height, width, 3) else None
+
+    # Write a resized overlay to the cache, replacing cached versions of older source files
+    def store_cached(self, cache_path, image):
+        try:
+            os.makedirs(self.cache_folder, exist_ok=True)
+            prefix = os.path.basename(cache_path).rsplit("_", 1)[0] + "_"
+            for old in os.listdir(self.cache_folder):
+                if old.startswith(prefix) and old.endswith(".npy"):
+                    os.remove(os.path.join(self.cache_folder, old))
+            # Write to a temporary file first so an interrupted write never leaves a broken cache entry
+            tmp_path = cache_path + ".tmp.npy"
+            np.save(tmp_path, image)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"WARNING: Could not cache overlay {cache_path}: {e}")
+
+    def load(self, key):
+        filename = self.overlay_paths.get(key)
+        if filename is None:
+            return None
+
+        img_path = os.path.join(self.folder_path, filename)
+        if not os.path.exists(img_path):
+            print(f"ERROR: File not found: {img_path}")
+            return None
+
+        cache_path = self.cache_path(img_path)
+        if cache_path is not None and os.path.exists(cache_path):
+            img_overlay = self.load_cached(cache_path)
+            if img_overlay is not None:
+                return img_overlay
+
+        img_overlay = cv2.imread(img_path)
+        if img_overlay is None:
+            print(f"ERROR: Could not load image {img_path}")
+            return None
+
+        if AirConfig.debug_mode:
+            print(f"Original size: {img_overlay.shape}")
+
+        width, height = self.size
+        # If image is taller than header height crop
+        if img_overlay.shape[0] > height:
+            img_overlay = img_overlay[:height, :, :]
+            if AirConfig.debug_mode:
+                print(f"Cropped to header height: {img_overlay.shape}")
+
+        # Resize to full width
+        img_overlay = cv2.resize(img_overlay, (width, height))
+
+        if AirConfig.debug_mode:
+            print(f"Added '{key}' overlay with shape: {img_overlay.shape}")
+        if cache_path is not None:
+            self.store_cached(cache_path, img_overlay)
+        return img_overlay
+
+    def get(self, key, default = None):
+        if key not in self.images:
+            self.images[key] = self.load(key)
+        image = self.images[key]
+        return default if image is None else image
+
+    def __getitem__(self, key):
+        image = self.get(key)
+        if image is None:
+            raise KeyError(key)
+        return image
+
+    def __setitem__(self, key, image):
+        self.images[key] = image
+
+    # True if the overlay exists and loads (loading it if needed)
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    # Loaded (or registered) overlays
+    def loaded(self):
+        return {key: image for key, image in self.images.items() if image is not None}
+
+
+# Pre-rendered static UI: header overlay, header boundary line and the brush size buttons
+# with the current size. The layer is only redrawn when the header or brush size changes,
+# and is applied with a masked copy per UI region instead of redrawing every frame.
+class UILayer:
+    def __init__(self, width, height, header_height):
+        self.width = width
+        self.height = height
+        self.header_height = header_height
+        self.state = None
+        self.regions = [] # (x_min, y_min, x_max, y_max, image, mask, transparency) per UI region
+
+    # Draw the UI on image (colors) and mask (255 where the UI covers the frame)
+    def render(self, header, brush_thickness):
+        W = self.width
+        image = np.zeros((self.height, W, 3), np.uint8)
+        mask = np.zeros((self.height, W), np.uint8)
+
+        def line(p1, p2, color, thickness):
+            cv2.line(image, p1, p2, color, thickness)
+            cv2.line(mask, p1, p2, 255, thickness)
+
+        def rectangle(p1, p2, color):
+            cv2.rectangle(image, p1, p2, color, cv2.FILLED)
+            cv2.rectangle(mask, p1, p2, 255, cv2.FILLED)
+
+        def text(label, org, scale, color, thickness):
+            cv2.putText(image, label, org, cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness)
+            cv2.putText(mask, label, org, cv2.FONT_HERSHEY_SIMPLEX, scale, 255, thickness)
+
+        # Apply current overlay header
+        if header is not None and header.shape[0] == self.header_height and header.shape[1] == W:
+            image[0:self.header_height, 0:W] = header
+            mask[0:self.header_height, 0:W] = 255
+
+        # Add a visible boundary line to show where header ends
+        line((0, self.header_height), (W, self.header_height), (0, 0, 0), 3)
+        line((0, self.header_height), (W, self.header_height), (255, 255, 255), 1)
+
+        # Draw brush size controls on right side, vertically stacked
+        # Plus button (top)
+        rectangle((W-70, 200), (W-20, 250), (50, 50, 50))
+        text("+", (W-55, 235), 1.5, (255, 255, 255), 3)
+
+        # Minus button (bottom)
+        rectangle((W-70, 270), (W-20, 320), (50, 50, 50))
+        text("-", (W-55, 305), 1.5, (255, 255, 255), 3)
+
+        # Current brush size display (centered between buttons)
+        text(f"{brush_thickness}", (W-55, 370), 1.2, (255, 255, 255), 2)
+
+        # Keep only the covered parts: the header band (down to the end of the boundary line)
+        # and the bounding box of the controls
+        below_header = mask[self.header_height:].any(axis=1)
+        band_bottom = self.header_height + int(np.argmin(below_header))
+        regions = [(0, 0, W, band_bottom)]
+        x, y, w, h = cv2.boundingRect(mask[band_bottom:])
+        if w > 0 and h > 0:
+            regions.append((x, band_bottom + y, x + w, band_bottom + y + h))
+
+        self.regions = []
+        for x_min, y_min, x_max, y_max in regions:
+            region_mask = mask[y_min:y_max, x_min:x_max]
+            # Anti-aliased edges (some OpenCV builds anti-alias Hershey text) need blending,
+            # the image is drawn over black so it is already premultiplied by the coverage
+            transparency = None
+            if np.any((region_mask > 0) & (region_mask < 255)):
+                transparency = ((255 - region_mask) / 255.0).astype(np.float32)[:, :, None]
+            self.regions.append((x_min, y_min, x_max, y_max, image[y_min:y_max, x_min:x_max].copy(),
+                                 region_mask.copy(), transparency))
+
+    # Apply the layer to frame in place. state identifies what the layer shows (the header
+    # overlay key and brush size); the layer is re-rendered only when it changes.
+    def apply(self, frame, state, header, brush_thickness):
+        if state != self.state:
+            self.render(header, brush_thickness)
+            self.state = state
+
+        for x_min, y_min, x_max, y_max, image, mask, transparency in self.regions:
+            target = frame[y_min:y_max, x_min:x_max]
+            if transparency is None:
+                cv2.copyTo(image, mask, target)
+            else:
+                target[:] = np.minimum(image + target * transparency + 0.5, 255)
+        return frame
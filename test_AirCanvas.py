@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from AirCanvas import AirCanvasApp
+import AirConfig
+
+DRAW = (0, 1, 0, 0, 0) # only the index finger up
+
+
+@pytest.fixture
+def app():
+    app = AirCanvasApp()
+    yield app
+    app.close()
+
+
+# Landmarks (hands, 21, 3) with every landmark of a hand at its fingertip point
+def hand_landmarks(*points):
+    landmarks = np.zeros((len(points), 21, 3), np.int64)
+    landmarks[:, :, 0] = np.arange(21)
+    landmarks[:, :, 1:] = np.asarray(points)[:, None, :]
+    return landmarks
+
+
+# Move every hand along its path with the drawing gesture, one frame per point
+def draw(app, paths, start_time):
+    frame = np.zeros((AirConfig.CANVAS_HEIGHT, AirConfig.CANVAS_WIDTH, 3), np.uint8)
+    for i, points in enumerate(zip(*paths)):
+        fingers = np.array([DRAW] * len(points))
+        app.update(frame, hand_landmarks(*points), fingers, None, start_time + i * 0.05)
+
+
+def last_stroke(app):
+    records = app.strokes.items()[1]
+    return tuple(records["color"][-1].tolist()), int(records["thickness"][-1])
+
+
+def test_keyboard_changes_reach_the_drawing_hand(app):
+    app.landmark_filter = None
+    draw(app, [[(400, 400), (500, 420), (600, 400)]], 0.0)
+    assert last_stroke(app) == (tuple(AirConfig.default_color), AirConfig.default_brush_thickness)
+
+    app.handle_key(ord('c'))
+    app.handle_key(ord('+'))
+    draw(app, [[(600, 600), (700, 620), (800, 600)]], 0.2)
+    assert last_stroke(app) == (tuple(app.draw_color), app.brush_thickness)
+    assert app.brush_thickness == AirConfig.default_brush_thickness + 5
+
+    for key in "010020030":
+        app.handle_key(ord(key))
+    draw(app, [[(800, 800), (900, 820), (1000, 800)]], 0.4)
+    assert last_stroke(app) == ((10, 20, 30), app.brush_thickness)
+
+
+def test_second_hand_draws_with_a_copy(app):
+    app.landmark_filter = None
+    draw(app, [[(400, 400), (500, 420)], [(1200, 400), (1300, 420)]], 0.0)
+    first, second = app.cursors.values()
+    assert first is app.cursor
+    assert second is not app.cursor
+    assert second.draw_color == first.draw_color
+
+
+def test_new_hand_takes_over_the_free_cursor(app):
+    app.landmark_filter = None
+    draw(app, [[(400, 400), (500, 420)]], 0.0)
+    # The hand is lost long enough for its track to end, a new hand holds the keyboard settings
+    draw(app, [[(1200, 800), (1300, 820)]], AirConfig.hand_track_timeout + 1.0)
+    assert list(app.cursors.values()) == [app.cursor]
+    app.handle_key(ord('+'))
+    draw(app, [[(1300, 820), (1400, 800)]], AirConfig.hand_track_timeout + 1.2)
+    assert last_stroke(app)[1] == app.brush_thickness
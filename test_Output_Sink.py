@@ -0,0 +1,134 @@
+import threading
+import time
+import urllib.error
+import urllib.request
+import cv2
+import numpy as np
+import pytest
+from Output_Sink import MJPEGServer, ThreadedSink
+
+
+# Writes frame to sink every few milliseconds until stopped, like the frame loop
+class FrameFeeder:
+    def __init__(self, sink, frame):
+        self.sink = sink
+        self.frame = frame
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.sink.write(self.frame)
+            time.sleep(0.005)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+
+# Consumes frames one at a time, holding the first one until released
+class BlockingSink(ThreadedSink):
+    def __init__(self):
+        super().__init__("blocking-sink")
+        self.consumed = []
+        self.busy = threading.Event()
+        self.release = threading.Event()
+
+    def consume(self, frame):
+        self.busy.set()
+        self.release.wait(5.0)
+        self.consumed.append(frame)
+
+
+@pytest.fixture
+def server():
+    sink = MJPEGServer(port=0, width=32).start()
+    yield sink
+    sink.close()
+
+
+def url(sink, path):
+    return f"http://127.0.0.1:{sink.port}{path}"
+
+
+# Next part of an MJPEG stream, returns the JPEG bytes
+def read_part(response):
+    assert response.readline().strip() == f"--{MJPEGServer.BOUNDARY}".encode()
+    headers = {}
+    while True:
+        line = response.readline().strip()
+        if not line:
+            break
+        name, value = line.decode().split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+    assert headers["content-type"] == "image/jpeg"
+    jpeg = response.read(int(headers["content-length"]))
+    assert response.read(2) == b"\r\n"
+    return jpeg
+
+
+def test_port_zero_picks_a_free_port(server):
+    assert server.port != 0
+
+
+def test_snapshot_is_the_downscaled_frame(server):
+    frame = np.full((48, 64, 3), (255, 0, 0), np.uint8)
+    with FrameFeeder(server, frame):
+        with urllib.request.urlopen(url(server, "/snapshot.jpg"), timeout=5) as response:
+            assert response.status == 200
+            assert response.headers["Content-Type"] == "image/jpeg"
+            img = cv2.imdecode(np.frombuffer(response.read(), np.uint8), cv2.IMREAD_COLOR)
+    assert img.shape == (24, 32, 3)
+    assert np.abs(img.astype(int) - (255, 0, 0)).max() < 8
+
+
+def test_stream_sends_jpeg_parts(server):
+    frame = np.zeros((48, 64, 3), np.uint8)
+    with FrameFeeder(server, frame):
+        with urllib.request.urlopen(url(server, "/stream.mjpg"), timeout=5) as response:
+            assert response.headers["Content-Type"] == f"multipart/x-mixed-replace; boundary={MJPEGServer.BOUNDARY}"
+            for _ in range(3):
+                img = cv2.imdecode(np.frombuffer(read_part(response), np.uint8), cv2.IMREAD_COLOR)
+                assert img.shape == (24, 32, 3)
+
+
+def test_unknown_path_is_not_found(server):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(url(server, "/missing"), timeout=5)
+    assert error.value.code == 404
+
+
+# A busy sink keeps only the newest frame, the ones it replaced are counted as dropped
+def test_busy_sink_keeps_the_newest_frame():
+    sink = BlockingSink().start()
+    sink.write(0)
+    assert sink.busy.wait(5.0)
+    for i in range(1, 5):
+        sink.write(i)
+    assert sink.dropped == 3
+    sink.release.set()
+    sink.close()
+    assert sink.consumed == [0, 4]
+
+
+def test_close_ends_streams_and_stops_serving():
+    sink = MJPEGServer(port=0).start()
+    frame = np.zeros((48, 64, 3), np.uint8)
+    with FrameFeeder(sink, frame):
+        response = urllib.request.urlopen(url(sink, "/stream.mjpg"), timeout=5)
+        read_part(response)
+        sink.close()
+    # The open stream ends once the server is closed
+    deadline = time.monotonic() + 5.0
+    while response.read(65536) and time.monotonic() < deadline:
+        pass
+    assert not response.read(65536)
+    response.close()
+
+    assert sink.thread is None and sink.server is None
+    with pytest.raises(urllib.error.URLError):
+        urllib.request.urlopen(url(sink, "/snapshot.jpg"), timeout=5)
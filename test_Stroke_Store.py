@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from Stroke_Store import StrokeStore, capsule_intervals
+
+
+# Distance of points (n, 2) to the segment a-b
+def segment_distance(points, a, b):
+    a, b = np.asarray(a, np.float64), np.asarray(b, np.float64)
+    d = b - a
+    length2 = d @ d
+    t = np.clip((points - a) @ d / length2, 0.0, 1.0) if length2 > 0 else np.zeros(len(points))
+    return np.hypot(*(points - (a + t[:, None] * d)).T)
+
+
+def test_capsule_intervals_match_brute_force():
+    rng = np.random.default_rng(7)
+    n = 400
+    x1, y1, x2, y2 = (rng.integers(0, 200, n) for _ in range(4))
+    x2[:20], y2[:20] = x1[:20], y1[:20] # points
+    radius = rng.uniform(1.0, 40.0, n)
+    t = np.linspace(0.0, 1.0, 2001)
+    for e_start, e_end in (((50, 60), (150, 120)), ((100, 100), (100, 100)), ((0, 180), (190, 10))):
+        t_in, t_out = capsule_intervals(x1, y1, x2, y2, e_start, e_end, radius)
+        for i in range(n):
+            p0, p1 = np.array([x1[i], y1[i]], np.float64), np.array([x2[i], y2[i]], np.float64)
+            distance = segment_distance(p0 + t[:, None] * (p1 - p0), e_start, e_end)
+            inside = (t >= t_in[i] - 1e-9) & (t <= t_out[i] + 1e-9)
+            assert np.all(inside[distance < radius[i] - 1e-6])
+            assert not np.any(inside[distance > radius[i] + 1e-6])
+
+
+@pytest.fixture
+def store():
+    store = StrokeStore(cell_size=16)
+    # Horizontal stroke from x = 0 to 200, the eraser reaches 10 + 4 / 2 + 2 (margin) = 14 pixels from it
+    store.append(0, 100, 200, 100, (0, 0, 255), 4, 1.0, path_id=3)
+    return store
+
+
+def strokes(store):
+    records = store.items()[1]
+    return [(int(r["x1"]), int(r["y1"]), int(r["x2"]), int(r["y2"])) for r in records]
+
+
+def test_erase_shortens_the_head(store):
+    erased = store.erase(200, 50, 200, 150, 10)
+    assert len(erased) == 1
+    assert strokes(store) == [(0, 100, 186, 100)]
+    # The index follows the shorter stroke: its rectangle (padded by 8) now ends in the 192-207 cell
+    assert len(store.query((210, 96, 215, 104))) == 0
+
+
+def test_erase_shortens_the_tail(store):
+    store.erase(0, 50, 0, 150, 10)
+    assert strokes(store) == [(14, 100, 200, 100)]
+
+
+def test_erase_splits_in_the_middle(store):
+    store.erase(100, 50, 100, 150, 10)
+    assert strokes(store) == [(0, 100, 86, 100), (114, 100, 200, 100)]
+    records = store.items()[1]
+    assert records["path_id"].tolist() == [3, 3]
+    assert records["color"].tolist() == [[0, 0, 255]] * 2
+
+
+def test_erase_removes_covered_strokes(store):
+    store.erase(-10, 100, 210, 100, 10)
+    assert len(store) == 0
+
+
+def test_erase_misses_distant_strokes(store):
+    assert len(store.erase(100, 200, 150, 200, 10)) == 0
+    assert strokes(store) == [(0, 100, 200, 100)]